@@ -2,16 +2,23 @@ from rest_framework import viewsets
 from rest_framework.permissions import AllowAny
 
 from .serializers import IngredientSerializer, TagSerializer
+from recipes.cache import ConditionalGetMixin
 from recipes.models import Ingredient, Tag
+from recipes.search import IngredientSearchMixin
+from recipes.snapshots import SnapshotMixin
 
 
-class IngredientsViewSet(viewsets.ReadOnlyModelViewSet):
+class IngredientsViewSet(ConditionalGetMixin, IngredientSearchMixin,
+                         SnapshotMixin, viewsets.ReadOnlyModelViewSet):
+    cache_models = (Ingredient,)
     queryset = Ingredient.objects.all()
     permission_classes = (AllowAny, )
     serializer_class = IngredientSerializer
 
 
-class TagsViewSet(viewsets.ReadOnlyModelViewSet):
+class TagsViewSet(ConditionalGetMixin, SnapshotMixin,
+                  viewsets.ReadOnlyModelViewSet):
+    cache_models = (Tag,)
     queryset = Tag.objects.all()
     permission_classes = (AllowAny, )
     serializer_class = TagSerializer
@@ -65,6 +65,39 @@ DATABASES = {
     }
 }
 
+# Версии моделей и ответы хранятся в кеше, поэтому воркеры gunicorn
+# должны делить один бэкенд: в docker-compose это memcached
+# (CACHE_BACKEND=django.core.cache.backends.memcached.PyMemcacheCache,
+# CACHE_LOCATION=memcached:11211). Локальная память годится только
+# для одного процесса: разработки и тестов.
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv('CACHE_BACKEND',
+                             'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', ''),
+    }
+}
+
+RESPONSE_CACHE_TIMEOUT = int(os.getenv('RESPONSE_CACHE_TIMEOUT', 300))
+
+# Конфигурация полнотекстового поиска PostgreSQL.
+SEARCH_CONFIG = os.getenv('SEARCH_CONFIG', 'russian')
+
+# Файл индекса похожих рецептов, собирается build_similar_index.
+SIMILAR_INDEX_PATH = os.getenv(
+    'SIMILAR_INDEX_PATH', os.path.join(BASE_DIR, 'similar_index.npz'))
+
+MAX_IMAGE_SIZE = int(os.getenv('MAX_IMAGE_SIZE', 5 * 1024 * 1024))
+# Тело запроса с картинкой в base64 примерно на треть больше самой картинки.
+DATA_UPLOAD_MAX_MEMORY_SIZE = MAX_IMAGE_SIZE * 4 // 3 + 1024 * 1024
+# Файлы из multipart/form-data пишутся сразу во временный файл по частям.
+FILE_UPLOAD_HANDLERS = (
+    'django.core.files.uploadhandler.TemporaryFileUploadHandler',
+)
+
+SHOPPING_LIST_FONT = os.getenv(
+    'SHOPPING_LIST_FONT', '/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf')
+
 DJOSER = {
     'LOGIN_FIELD': 'email',
     'SERIALIZERS': {
@@ -18,6 +18,7 @@ class TagAdmin(admin.ModelAdmin):
 class IngredientAdmin(admin.ModelAdmin):
     list_display = ('name', 'measurement_unit')
     list_filter = ('name',)
+    search_fields = ('name',)
     empty_value_display = '-пусто-'
 
 
@@ -29,7 +30,7 @@ class RecipeAdmin(admin.ModelAdmin):
     empty_value_display = '-пусто-'
 
     def total_favorites(self, obj):
-        return obj.favorite.count()
+        return obj.favorites_count
 
     total_favorites.short_description = 'Избранное'
     list_display += ('total_favorites',)
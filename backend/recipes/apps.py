@@ -5,6 +5,9 @@ class RecipesConfig(AppConfig):
     name = 'recipes'
     verbose_name = 'Рецепты'
 
+    def ready(self):
+        from . import signals  # noqa: F401
+
 
 class UsersConfig(AppConfig):
     name = 'users'
@@ -0,0 +1,194 @@
+import hashlib
+import threading
+import time
+from collections import Counter
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.cache import (get_conditional_response, patch_vary_headers,
+                                quote_etag)
+from django.utils.http import http_date
+from rest_framework.response import Response
+
+VERSION_KEY = 'version:{}'
+MODIFIED_KEY = 'modified:{}'
+RESPONSE_KEY = 'response:{}'
+
+_local = threading.local()
+
+
+def get_scope_key(model, scope=None):
+    key = model._meta.label_lower
+    if scope is not None:
+        key = f'{key}:{scope}'
+    return key
+
+
+def get_model_state(models, scope=None):
+    """
+    Возвращает версии моделей и время их последнего изменения
+    одним обращением к кешу.
+
+    Отсутствующий счётчик заводится от текущего времени, чтобы после
+    вытеснения из кеша версии не начинались заново и старые ответы
+    не становились снова актуальными.
+    """
+    scope_keys = [get_scope_key(model, scope) for model in models]
+    version_keys = [VERSION_KEY.format(key) for key in scope_keys]
+    modified_keys = [MODIFIED_KEY.format(key) for key in scope_keys]
+    values = cache.get_many(version_keys + modified_keys)
+    for key in version_keys:
+        if key not in values:
+            cache.add(key, time.time_ns(), timeout=None)
+            values[key] = cache.get(key)
+    for key in modified_keys:
+        if key not in values:
+            cache.add(key, time.time(), timeout=None)
+            values[key] = cache.get(key)
+    versions = [values[key] for key in version_keys]
+    last_modified = max((values[key] for key in modified_keys), default=0)
+    return versions, last_modified
+
+
+def get_versions(models, scope=None):
+    return get_model_state(models, scope)[0]
+
+
+def bump_version(model, scope=None):
+    scope_key = get_scope_key(model, scope)
+    key = VERSION_KEY.format(scope_key)
+    try:
+        cache.incr(key)
+    except ValueError:
+        if not cache.add(key, time.time_ns(), timeout=None):
+            cache.incr(key)
+    cache.set(MODIFIED_KEY.format(scope_key), time.time(), timeout=None)
+    # Считаются только общие версии моделей: их число ограничено,
+    # а ключей по пользователям за жизнь процесса набирается сколько угодно.
+    if scope is None:
+        _local.__dict__.setdefault('bumps', Counter())[scope_key] += 1
+
+
+def get_own_bumps(models):
+    """
+    Сколько раз текущий поток поднял общие версии моделей. Разница
+    до и после своих изменений отделяет их от изменений других процессов.
+    """
+    bumps = getattr(_local, 'bumps', {})
+    return [bumps.get(get_scope_key(model), 0) for model in models]
+
+
+def get_response_cache_key(request, models):
+    query = urlencode(sorted(
+        (param, sorted(values))
+        for param, values in request.query_params.lists()
+    ), doseq=True)
+    user_class = 'anon' if request.user.is_anonymous else 'auth'
+    versions = ':'.join(str(version) for version in get_versions(models))
+    raw_key = f'{request.path}?{query}:{user_class}:{versions}'
+    return RESPONSE_KEY.format(hashlib.md5(raw_key.encode()).hexdigest())
+
+
+class ConditionalGetMixin:
+    """
+    Отдаёт ETag и Last-Modified для list/retrieve и отвечает 304
+    до запуска сериализаторов.
+
+    Валидаторы считаются по версиям cache_models и по версиям
+    user_cache_models текущего пользователя. Если задано modified_field,
+    для retrieve вместо cache_models берутся поле объекта и версии
+    object_cache_models, от которых зависят вложенные данные.
+    """
+    cache_models = ()
+    user_cache_models = ()
+    object_cache_models = ()
+    modified_field = None
+
+    def list(self, request, *args, **kwargs):
+        return self.get_conditional_response(super().list,
+                                             request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.get_conditional_response(super().retrieve,
+                                             request, *args, **kwargs)
+
+    def get_object_modified(self):
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        lookup = {self.lookup_field: self.kwargs[lookup_url_kwarg]}
+        try:
+            return self.queryset.filter(**lookup).values_list(
+                self.modified_field, flat=True).first()
+        except (TypeError, ValueError):
+            return None
+
+    def get_validators(self, request):
+        detail = self.action == 'retrieve' and self.modified_field
+        versions, last_modified = get_model_state(
+            self.object_cache_models if detail else self.cache_models)
+        parts = [request.accepted_renderer.format, *versions]
+
+        if request.user.is_authenticated and self.user_cache_models:
+            user_versions, user_modified = get_model_state(
+                self.user_cache_models, scope=request.user.pk)
+            parts += [request.user.pk, *user_versions]
+            last_modified = max(last_modified, user_modified)
+
+        if detail:
+            modified = self.get_object_modified()
+            if modified is None:
+                return None, None
+            parts.append(modified.isoformat())
+            last_modified = max(last_modified, modified.timestamp())
+
+        raw_etag = ':'.join(str(part) for part in parts)
+        etag = quote_etag(hashlib.md5(raw_etag.encode()).hexdigest())
+        return etag, int(last_modified)
+
+    def get_conditional_response(self, handler, request, *args, **kwargs):
+        etag, last_modified = self.get_validators(request)
+        if etag is None:
+            return handler(request, *args, **kwargs)
+
+        response = get_conditional_response(request, etag=etag,
+                                            last_modified=last_modified)
+        if response is None:
+            response = handler(request, *args, **kwargs)
+        if response.status_code in (200, 304):
+            response['ETag'] = etag
+            response['Last-Modified'] = http_date(last_modified)
+            patch_vary_headers(response, ('Authorization',))
+        return response
+
+
+class CachedResponseMixin:
+    """
+    Кеширует ответы list/retrieve до изменения любой из cache_models.
+
+    Если ответ зависит от пользователя, cache_authenticated выставляется
+    в False и кешируются только ответы анонимным пользователям.
+    """
+    cache_models = ()
+    cache_authenticated = True
+
+    def list(self, request, *args, **kwargs):
+        return self.get_cached_response(super().list,
+                                        request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.get_cached_response(super().retrieve,
+                                        request, *args, **kwargs)
+
+    def get_cached_response(self, handler, request, *args, **kwargs):
+        if not self.cache_authenticated and request.user.is_authenticated:
+            return handler(request, *args, **kwargs)
+
+        key = get_response_cache_key(request, self.cache_models)
+        data = cache.get(key)
+        if data is not None:
+            return Response(data)
+
+        response = handler(request, *args, **kwargs)
+        if response.status_code == 200:
+            cache.set(key, response.data, settings.RESPONSE_CACHE_TIMEOUT)
+        return response
@@ -0,0 +1,44 @@
+from django.db.models import Count, Exists, OuterRef, Q
+
+from .models import Recipe, Tag
+from .serializers import TagSerializer
+from .snapshots import get_snapshot
+
+# Диапазоны времени приготовления в минутах, None - без верхней границы.
+COOKING_TIME_BUCKETS = ((1, 15), (16, 30), (31, 60), (61, None))
+
+
+def get_recipe_facets(queryset, tags_condition=Q()):
+    """
+    Число рецептов по каждому тегу и диапазону времени приготовления
+    для отфильтрованных рецептов. Все счётчики считаются одним
+    агрегирующим запросом с условными COUNT вместо запроса на тег.
+    Условие по выбранным тегам tags_condition входит в итог и диапазоны
+    времени, но не в счётчики тегов.
+    """
+    tags = get_snapshot(Tag, TagSerializer).data_by_id
+    recipe_tags = Recipe.tags.through.objects.filter(recipe=OuterRef('pk'))
+    aggregates = {'total': Count('pk', filter=tags_condition)}
+    for pk in tags:
+        aggregates[f'tag_{pk}'] = Count(
+            'pk', filter=Q(Exists(recipe_tags.filter(tag=pk))))
+    for index, (low, high) in enumerate(COOKING_TIME_BUCKETS):
+        condition = tags_condition & Q(cooking_time__gte=low)
+        if high is not None:
+            condition &= Q(cooking_time__lte=high)
+        aggregates[f'time_{index}'] = Count('pk', filter=condition)
+    # Фильтры могут добавить аннотации (rank у поиска): с ними aggregate
+    # оборачивает запрос в подзапрос, и OuterRef('pk') в счётчиках тегов
+    # указывает на отсутствующий столбец. Поэтому от фильтров берутся
+    # только id.
+    counts = Recipe.objects.filter(
+        pk__in=queryset.order_by().values('pk')).aggregate(**aggregates)
+    return {
+        'count': counts['total'],
+        'tags': [{**tag, 'count': counts[f'tag_{pk}']}
+                 for pk, tag in tags.items()],
+        'cooking_time': [
+            {'min': low, 'max': high, 'count': counts[f'time_{index}']}
+            for index, (low, high) in enumerate(COOKING_TIME_BUCKETS)
+        ],
+    }
@@ -0,0 +1,111 @@
+from functools import partial
+
+from django.db import connection, transaction
+
+from users.models import Follow
+from .models import FeedEntry, Recipe
+
+# Подписчиков, которым новый рецепт раскладывается одним запросом.
+FANOUT_BATCH_SIZE = 1000
+
+
+def insert_feed_entries(select_sql, params):
+    """
+    Добавляет записи ленты строками из SELECT (user_id, recipe_id,
+    pub_date), пропуская уже существующие.
+    """
+    qn = connection.ops.quote_name
+    opts = FeedEntry._meta
+    columns = ', '.join(qn(opts.get_field(name).column)
+                        for name in ('user', 'recipe', 'pub_date'))
+    sql = (
+        f'{connection.ops.insert_statement(ignore_conflicts=True)} '
+        f'{qn(opts.db_table)} ({columns}) {select_sql} '
+        f'{connection.ops.ignore_conflicts_suffix_sql(ignore_conflicts=True)}'
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+
+
+def insert_follower_entries(recipe_id, pub_date, author_id,
+                            after=None, last=None):
+    """
+    Один INSERT ... SELECT по подпискам: строки не проходят через Python.
+    after и last ограничивают id подписчиков диапазоном (after, last].
+    """
+    qn = connection.ops.quote_name
+    opts = Follow._meta
+    user_column = qn(opts.get_field('user').column)
+    conditions = [f'{qn(opts.get_field("following").column)} = %s']
+    params = [recipe_id, pub_date, author_id]
+    if after is not None:
+        conditions.append(f'{user_column} > %s')
+        params.append(after)
+    if last is not None:
+        conditions.append(f'{user_column} <= %s')
+        params.append(last)
+    insert_feed_entries(
+        f'SELECT {user_column}, %s, %s FROM {qn(opts.db_table)} '
+        f'WHERE {" AND ".join(conditions)}',
+        params)
+
+
+def fan_out_in_batches(recipe_id, pub_date, author_id):
+    """
+    Раскладывает рецепт подписчикам пачками по FANOUT_BATCH_SIZE, каждая
+    в своей транзакции. Граница пачки находится по индексу
+    (following, user), сами строки копирует INSERT ... SELECT.
+    """
+    followers = (Follow.objects.filter(following=author_id)
+                 .order_by('user_id').values_list('user_id', flat=True))
+    after = None
+    while True:
+        if after is not None:
+            batch = followers.filter(user_id__gt=after)
+        else:
+            batch = followers
+        last = next(iter(batch[FANOUT_BATCH_SIZE - 1:FANOUT_BATCH_SIZE]),
+                    None)
+        with transaction.atomic():
+            insert_follower_entries(recipe_id, pub_date, author_id,
+                                    after, last)
+        if last is None:
+            return
+        after = last
+
+
+def fan_out_recipe(recipe):
+    """
+    Раскладывает новый рецепт в ленты всех подписчиков автора.
+    Небольшой аудитории - одним запросом в транзакции создания рецепта.
+    Если подписчиков больше FANOUT_BATCH_SIZE, ленты заполняются
+    пачками после коммита, и создание рецепта не держит блокировки
+    на время вставки всех строк.
+    """
+    if recipe.author.followers_count <= FANOUT_BATCH_SIZE:
+        insert_follower_entries(recipe.pk, recipe.pub_date,
+                                recipe.author_id)
+        return
+    transaction.on_commit(partial(fan_out_in_batches, recipe.pk,
+                                  recipe.pub_date, recipe.author_id))
+
+
+def backfill_feed(user_id, author_ids):
+    """Добавляет в ленту пользователя рецепты новых подписок."""
+    if not author_ids:
+        return
+    qn = connection.ops.quote_name
+    opts = Recipe._meta
+    placeholders = ', '.join(['%s'] * len(author_ids))
+    insert_feed_entries(
+        f'SELECT %s, {qn(opts.pk.column)}, '
+        f'{qn(opts.get_field("pub_date").column)} '
+        f'FROM {qn(opts.db_table)} '
+        f'WHERE {qn(opts.get_field("author").column)} IN ({placeholders})',
+        (user_id, *author_ids))
+
+
+def prune_feed(user_id, author_ids):
+    """Убирает из ленты пользователя рецепты отменённых подписок."""
+    FeedEntry.objects.filter(
+        user=user_id, recipe__author__in=author_ids).delete()
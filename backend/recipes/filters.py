@@ -1,27 +1,88 @@
 import django_filters
+from django.db.models import Exists, OuterRef, Q
 
 from .models import Recipe, Tag
+from .search import search_recipes
+from .serializers import TagSerializer
+from .snapshots import get_snapshot
+
+
+def get_tag_ids_by_slug():
+    return get_snapshot(Tag, TagSerializer).get_ids_by('slug')
+
+
+def get_tag_choices():
+    return [(slug, slug) for slug in get_tag_ids_by_slug()]
 
 
 class RecipeFilter(django_filters.FilterSet):
     is_favorited = django_filters.NumberFilter(method='get_is_favorited')
     is_in_shopping_cart = (django_filters.NumberFilter
                            (method='get_is_in_shopping_cart'))
-    tags = (django_filters.ModelMultipleChoiceFilter
-            (field_name='tags__slug',
-             queryset=Tag.objects.all(),
-             to_field_name='slug'))
+    tags = django_filters.MultipleChoiceFilter(choices=get_tag_choices,
+                                               method='get_tags')
+    all_tags = django_filters.NumberFilter(method='get_all_tags')
+    search = django_filters.CharFilter(method='get_search')
 
     class Meta:
         model = Recipe
         fields = ('tags', 'author', 'is_favorited', 'is_in_shopping_cart')
 
+    def filter_by_user(self, queryset, lookup, value):
+        """
+        У анонимного пользователя нет избранного и корзины: фильтр
+        по ним даёт пустой список, а не ошибку на AnonymousUser.
+        """
+        if not value:
+            return queryset
+        if self.request.user.is_anonymous:
+            return queryset.none()
+        return queryset.filter(**{lookup: self.request.user})
+
     def get_is_favorited(self, queryset, name, value):
-        if value:
-            return queryset.filter(favorite__user=self.request.user)
-        return queryset
+        return self.filter_by_user(queryset, 'favorite__user', value)
 
     def get_is_in_shopping_cart(self, queryset, name, value):
-        if value:
-            return queryset.filter(shopping_cart__user=self.request.user)
+        return self.filter_by_user(queryset, 'shopping_cart__user', value)
+
+    def get_tags(self, queryset, name, value):
+        if not value:
+            return queryset
+        return queryset.filter(self.get_tags_condition(value))
+
+    def get_tags_condition(self, value):
+        """
+        Теги проверяются подзапросом EXISTS по промежуточной таблице:
+        без JOIN рецепт не повторяется и DISTINCT не нужен. Слаги
+        переводятся в id по снимку тегов в памяти.
+        С all_tags=1 рецепт должен иметь все выбранные теги.
+        """
+        ids_by_slug = get_tag_ids_by_slug()
+        tag_ids = {ids_by_slug[slug] for slug in value}
+        recipe_tags = Recipe.tags.through.objects.filter(
+            recipe=OuterRef('pk'))
+        if self.form.cleaned_data.get('all_tags'):
+            return Q(*(Exists(recipe_tags.filter(tag=tag_id))
+                       for tag_id in tag_ids))
+        return Q(Exists(recipe_tags.filter(tag__in=tag_ids)))
+
+    def get_facet_filters(self):
+        """
+        Для фасетов: рецепты по всем фильтрам, кроме тегов, и отдельно
+        условие по выбранным тегам. Счётчики тегов считаются без него,
+        иначе выбранный тег обнулял бы остальные.
+        """
+        params = self.data.copy()
+        for name in ('tags', 'all_tags'):
+            params.pop(name, None)
+        queryset = type(self)(params, queryset=self.queryset,
+                              request=self.request).qs
+        tags = self.form.cleaned_data.get('tags')
+        return queryset, self.get_tags_condition(tags) if tags else Q()
+
+    def get_all_tags(self, queryset, name, value):
+        # Режим учитывается в get_tags.
         return queryset
+
+    def get_search(self, queryset, name, value):
+        return search_recipes(queryset, value)
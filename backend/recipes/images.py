@@ -0,0 +1,129 @@
+import base64
+import binascii
+import logging
+import os
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import TemporaryUploadedFile
+from PIL import Image, ImageOps
+from rest_framework import serializers
+
+from .models import Recipe
+
+# Длина куска кратна 4, чтобы каждый кусок декодировался отдельно.
+DECODE_CHUNK_SIZE = 64 * 1024
+THUMBNAIL_WIDTHS = (320, 640)
+THUMBNAIL_FORMATS = {'webp': 'WEBP', 'jpeg': 'JPEG'}
+THUMBNAIL_QUALITY = 80
+
+logger = logging.getLogger(__name__)
+
+
+def check_image_size(size):
+    if size > settings.MAX_IMAGE_SIZE:
+        raise serializers.ValidationError(
+            f'Размер изображения больше '
+            f'{settings.MAX_IMAGE_SIZE // (1024 * 1024)} МБ')
+
+
+def decode_base64_image(data):
+    """
+    Декодирует data:image/...;base64 во временный файл на диске по кускам.
+    Размер проверяется по длине строки до декодирования, поэтому
+    слишком большие изображения не доходят до Pillow.
+    """
+    header, _, encoded = data.partition(';base64,')
+    ext = header.split('/')[-1]
+    if not ext.isalnum():
+        raise serializers.ValidationError('Некорректный формат изображения')
+    check_image_size(len(encoded) * 3 // 4 - encoded[-2:].count('='))
+
+    image = TemporaryUploadedFile(f'uploaded_image.{ext}',
+                                  f'image/{ext}', 0, None)
+    try:
+        for start in range(0, len(encoded), DECODE_CHUNK_SIZE):
+            image.write(base64.b64decode(
+                encoded[start:start + DECODE_CHUNK_SIZE], validate=True))
+    except binascii.Error:
+        image.close()
+        raise serializers.ValidationError('Некорректные данные base64')
+    image.size = image.tell()
+    image.seek(0)
+    return image
+
+
+def get_thumbnail_name(name, width, extension):
+    directory, filename = os.path.split(name)
+    stem = os.path.splitext(filename)[0]
+    return os.path.join(directory, 'thumbs', f'{stem}_{width}.{extension}')
+
+
+def generate_thumbnails(name):
+    """
+    Сохраняет уменьшенные копии изображения во всех ширинах и форматах.
+    Уже созданные копии не пересоздаются.
+    """
+    missing = [
+        (width, extension, image_format)
+        for width in THUMBNAIL_WIDTHS
+        for extension, image_format in THUMBNAIL_FORMATS.items()
+        if not default_storage.exists(
+            get_thumbnail_name(name, width, extension))
+    ]
+    if not missing:
+        return
+    with default_storage.open(name) as file:
+        image = ImageOps.exif_transpose(Image.open(file))
+        image = image.convert('RGB')
+    for width, extension, image_format in missing:
+        thumbnail = image.copy()
+        thumbnail.thumbnail((width, image.height), Image.LANCZOS)
+        buffer = BytesIO()
+        thumbnail.save(buffer, image_format, quality=THUMBNAIL_QUALITY)
+        default_storage.save(get_thumbnail_name(name, width, extension),
+                             ContentFile(buffer.getvalue()))
+
+
+def try_generate_thumbnails(name):
+    """Ошибка в картинке не должна ломать уже сохранённый рецепт."""
+    try:
+        generate_thumbnails(name)
+    except (OSError, ValueError):
+        logger.exception('Не удалось создать уменьшенные копии %s', name)
+
+
+def release_image(name):
+    """
+    Удаляет файл картинки и её уменьшенные копии, если ни один рецепт
+    больше на неё не ссылается. Число ссылок считается по индексу
+    на Recipe.image.
+    """
+    if not name or Recipe.objects.filter(image=name).exists():
+        return
+    storage = Recipe._meta.get_field('image').storage
+    storage.delete(name)
+    for width in THUMBNAIL_WIDTHS:
+        for extension in THUMBNAIL_FORMATS:
+            default_storage.delete(get_thumbnail_name(name, width, extension))
+
+
+class ThumbnailsField(serializers.ReadOnlyField):
+    """Ссылки на уменьшенные копии: {ширина: {формат: url}}."""
+
+    def to_representation(self, image):
+        if not image:
+            return {}
+        request = self.context.get('request')
+        thumbnails = {}
+        for width in THUMBNAIL_WIDTHS:
+            thumbnails[str(width)] = {}
+            for extension in THUMBNAIL_FORMATS:
+                url = default_storage.url(
+                    get_thumbnail_name(image.name, width, extension))
+                if request is not None:
+                    url = request.build_absolute_uri(url)
+                thumbnails[str(width)][extension] = url
+        return thumbnails
@@ -0,0 +1,15 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from recipes.similar import SimilarIndex
+
+
+class Command(BaseCommand):
+    help = ('Строит индекс похожих рецептов (MinHash + LSH) и сохраняет '
+            'его в SIMILAR_INDEX_PATH')
+
+    def handle(self, *args, **options):
+        index = SimilarIndex.build()
+        index.save(settings.SIMILAR_INDEX_PATH)
+        self.stdout.write(f'Рецептов в индексе: {len(index.recipe_ids)}, '
+                          f'файл: {settings.SIMILAR_INDEX_PATH}')
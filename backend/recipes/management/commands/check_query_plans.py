@@ -0,0 +1,90 @@
+import re
+from types import SimpleNamespace
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.http import QueryDict
+
+from recipes.filters import RecipeFilter
+from recipes.models import (Favorite, IngredientInRecipe, Recipe,
+                            ShoppingCart, Tag)
+from users.models import Follow
+
+User = get_user_model()
+FULL_SCAN = {
+    'postgresql': re.compile(r'Seq Scan'),
+    # Проход по индексу в порядке сортировки страницы полным не считается:
+    # LIMIT останавливает его на первых подходящих строках.
+    'sqlite': re.compile(r'\bSCAN (?!CONSTANT ROW)(?!\S+ USING INDEX)'),
+}
+PAGE_SIZE = 10
+
+
+def filter_recipes(user, query):
+    """Страница списка, которую строит RecipeFilter по параметрам."""
+    return RecipeFilter(
+        QueryDict(query), queryset=Recipe.objects.all(),
+        request=SimpleNamespace(user=user)
+    ).qs.order_by('-pub_date', '-id')[:PAGE_SIZE]
+
+
+def get_hot_queries():
+    """
+    Горячие запросы сериализаторов, вьюсетов и RecipeFilter
+    на реальных идентификаторах из базы.
+    """
+    user = User.objects.order_by('pk').first()
+    recipe = Recipe.objects.order_by('pk').first()
+    tag = Tag.objects.order_by('pk').first()
+    if user is None or recipe is None or tag is None:
+        raise CommandError('Нужна заполненная база: пользователи, '
+                           'рецепты и теги')
+    return {
+        'favorite_exists': Favorite.objects.filter(
+            user=user, favorite=recipe),
+        'shopping_cart_exists': ShoppingCart.objects.filter(
+            user=user, recipe=recipe),
+        'follow_exists': Follow.objects.filter(
+            user=user, following=recipe.author_id),
+        'recipe_ingredients': IngredientInRecipe.objects.filter(
+            recipe=recipe),
+        'recipe_feed_page': Recipe.objects.filter(
+            pub_date__lt=recipe.pub_date
+        ).order_by('-pub_date', '-id')[:PAGE_SIZE],
+        'filter_author': filter_recipes(user, f'author={recipe.author_id}'),
+        'filter_is_favorited': filter_recipes(user, 'is_favorited=1'),
+        'filter_is_in_shopping_cart': filter_recipes(
+            user, 'is_in_shopping_cart=1'),
+        'filter_tags': filter_recipes(user, f'tags={tag.slug}'),
+        'filter_all_tags': filter_recipes(
+            user, f'tags={tag.slug}&all_tags=1'),
+    }
+
+
+class Command(BaseCommand):
+    help = ('Проверяет через EXPLAIN, что горячие запросы используют '
+            'индексы, и завершается ошибкой при полном сканировании')
+
+    def handle(self, *args, **options):
+        if connection.vendor not in FULL_SCAN:
+            raise CommandError(f'СУБД {connection.vendor} не поддерживается')
+        full_scan = FULL_SCAN[connection.vendor]
+        failed = []
+        with transaction.atomic():
+            if connection.vendor == 'postgresql':
+                # На маленьких таблицах планировщик и так выберет Seq Scan,
+                # поэтому он запрещается: если он остался, индекса нет.
+                with connection.cursor() as cursor:
+                    cursor.execute('SET LOCAL enable_seqscan = off')
+            for name, queryset in get_hot_queries().items():
+                plan = queryset.explain()
+                if full_scan.search(plan):
+                    failed.append(name)
+                    self.stdout.write(self.style.ERROR(name))
+                    self.stdout.write(plan)
+                else:
+                    self.stdout.write(self.style.SUCCESS(name))
+        if failed:
+            raise CommandError('Полное сканирование таблицы: '
+                               + ', '.join(failed))
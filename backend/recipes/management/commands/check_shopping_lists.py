@@ -0,0 +1,57 @@
+from functools import partial
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from recipes.cache import bump_version
+from recipes.models import ShoppingCart, ShoppingListItem
+from recipes.shopping_list import compute_shopping_list_totals
+
+
+class Command(BaseCommand):
+    help = ('Сверяет списки покупок с полным пересчётом по корзинам, '
+            'с --fix перестраивает их')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fix', action='store_true',
+                            help='Перестроить расходящиеся списки')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            expected = compute_shopping_list_totals()
+            actual = {
+                (user_id, ingredient_id): total_amount
+                for user_id, ingredient_id, total_amount
+                in ShoppingListItem.objects.values_list(
+                    'user', 'ingredient', 'total_amount').iterator()
+            }
+            mismatched = sorted(
+                key for key in expected.keys() | actual.keys()
+                if expected.get(key) != actual.get(key)
+            )
+            for user_id, ingredient_id in mismatched:
+                self.stdout.write(
+                    f'Пользователь {user_id}, ингредиент {ingredient_id}: '
+                    f'в списке {actual.get((user_id, ingredient_id), 0)}, '
+                    f'ожидается {expected.get((user_id, ingredient_id), 0)}')
+
+            if mismatched and options['fix']:
+                users = {user_id for user_id, _ in mismatched}
+                ShoppingListItem.objects.filter(user__in=users).delete()
+                ShoppingListItem.objects.bulk_create(
+                    ShoppingListItem(user_id=user_id,
+                                     ingredient_id=ingredient_id,
+                                     total_amount=total_amount)
+                    for (user_id, ingredient_id), total_amount
+                    in expected.items() if user_id in users
+                )
+                # Иначе кешированные выгрузки списка отдают старые данные.
+                for user_id in users:
+                    transaction.on_commit(
+                        partial(bump_version, ShoppingCart, scope=user_id))
+
+        if mismatched and not options['fix']:
+            raise CommandError(f'Расхождений: {len(mismatched)}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Исправлено расхождений: {len(mismatched)}' if mismatched
+            else 'Списки покупок согласованы'))
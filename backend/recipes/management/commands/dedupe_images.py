@@ -0,0 +1,77 @@
+import os
+
+from django.core.files import File
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from recipes.cache import bump_version
+from recipes.images import release_image, try_generate_thumbnails
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    help = ('Переносит картинки рецептов в хранилище с именами по хешу '
+            'содержимого и удаляет дубликаты')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Только показать, какие файлы будут перенесены')
+        parser.add_argument(
+            '--delete-unreferenced', action='store_true',
+            help='Удалить файлы каталога загрузки без ссылок из рецептов')
+
+    def handle(self, *args, **options):
+        field = Recipe._meta.get_field('image')
+        storage = field.storage
+        names = list(Recipe.objects.exclude(image='').exclude(image=None)
+                     .order_by().values_list('image', flat=True).distinct())
+        renamed = {}
+        for name in names:
+            if not storage.exists(name):
+                self.stderr.write(f'Нет файла: {name}')
+                continue
+            upload_name = field.generate_filename(None,
+                                                  os.path.basename(name))
+            with storage.open(name) as file:
+                target = storage.get_content_name(upload_name, File(file))
+                if target == name:
+                    continue
+                if not options['dry_run']:
+                    target = storage.save(upload_name, file)
+            renamed[name] = target
+            self.stdout.write(f'{name} -> {target}')
+
+        if options['dry_run']:
+            self.stdout.write(f'Будет перенесено: {len(renamed)}, '
+                              f'файлов после переноса: '
+                              f'{len(set(renamed.values()))}')
+            return
+
+        with transaction.atomic():
+            for name, target in renamed.items():
+                # updated_at меняет Last-Modified и ETag рецептов: клиенты
+                # не оставят в кеше ссылку на удалённый файл.
+                Recipe.objects.filter(image=name).update(
+                    image=target, updated_at=timezone.now())
+        for name, target in renamed.items():
+            release_image(name)
+            try_generate_thumbnails(target)
+        if renamed:
+            bump_version(Recipe)
+
+        deleted = 0
+        if options['delete_unreferenced']:
+            directory = os.path.dirname(field.generate_filename(None, 'image'))
+            referenced = set(Recipe.objects.exclude(image='')
+                             .values_list('image', flat=True))
+            for filename in storage.listdir(directory)[1]:
+                name = os.path.join(directory, filename)
+                if name not in referenced:
+                    storage.delete(name)
+                    deleted += 1
+        self.stdout.write(f'Перенесено: {len(renamed)}, '
+                          f'файлов после переноса: '
+                          f'{len(set(renamed.values()))}, '
+                          f'удалено без ссылок: {deleted}')
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from recipes.images import generate_thumbnails
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    help = 'Создаёт недостающие уменьшенные копии картинок рецептов'
+
+    def handle(self, *args, **options):
+        names = (Recipe.objects.exclude(image='').exclude(image=None)
+                 .order_by().values_list('image', flat=True).distinct())
+        processed = failed = 0
+        for name in names.iterator():
+            processed += 1
+            try:
+                generate_thumbnails(name)
+            except (OSError, ValueError) as error:
+                failed += 1
+                self.stderr.write(f'{name}: {error}')
+        self.stdout.write(f'Обработано картинок: {processed}, '
+                          f'с ошибками: {failed}')
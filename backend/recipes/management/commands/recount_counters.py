@@ -0,0 +1,34 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from recipes.models import Favorite, Recipe, ShoppingCart
+from users.models import Follow
+
+User = get_user_model()
+
+
+def count_subquery(model, field):
+    counts = (model.objects.filter(**{field: OuterRef('pk')})
+              .order_by().values(field)
+              .annotate(count=Count('pk')).values('count'))
+    return Coalesce(Subquery(counts, output_field=IntegerField()), 0)
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает счётчики избранного, корзин, рецептов и подписчиков'
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            recipes = Recipe.objects.update(
+                favorites_count=count_subquery(Favorite, 'favorite'),
+                in_carts_count=count_subquery(ShoppingCart, 'recipe'),
+            )
+            users = User.objects.update(
+                recipes_count=count_subquery(Recipe, 'author'),
+                followers_count=count_subquery(Follow, 'following'),
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f'Пересчитано рецептов: {recipes}, пользователей: {users}'))
@@ -0,0 +1,20 @@
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0007_recipe_pub_date_id_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True,
+                                       default=django.utils.timezone.now,
+                                       verbose_name='Дата изменения'),
+            preserve_default=False,
+        ),
+    ]
@@ -0,0 +1,68 @@
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, Min, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+UNIQUE_FIELDS = (
+    ('IngredientInRecipe', ('recipe', 'ingredient')),
+    ('Favorite', ('user', 'favorite')),
+    ('ShoppingCart', ('user', 'recipe')),
+)
+
+
+def count_subquery(model, field):
+    counts = (model.objects.filter(**{field: OuterRef('pk')})
+              .order_by().values(field)
+              .annotate(count=Count('pk')).values('count'))
+    return Coalesce(Subquery(counts, output_field=IntegerField()), 0)
+
+
+def remove_duplicates(apps, schema_editor):
+    for model_name, fields in UNIQUE_FIELDS:
+        model = apps.get_model('recipes', model_name)
+        duplicates = (model.objects.order_by().values(*fields)
+                      .annotate(min_id=Min('id'), count=Count('id'))
+                      .filter(count__gt=1))
+        for duplicate in duplicates:
+            model.objects.filter(
+                **{field: duplicate[field] for field in fields}
+            ).exclude(id=duplicate['min_id']).delete()
+
+    Recipe = apps.get_model('recipes', 'Recipe')
+    Recipe.objects.update(
+        favorites_count=count_subquery(
+            apps.get_model('recipes', 'Favorite'), 'favorite'),
+        in_carts_count=count_subquery(
+            apps.get_model('recipes', 'ShoppingCart'), 'recipe'),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0009_engagement_counters'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicates, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='ingredientinrecipe',
+            constraint=models.UniqueConstraint(
+                fields=('recipe', 'ingredient'),
+                name='unique_ingredient_in_recipe'),
+        ),
+        migrations.AddConstraint(
+            model_name='favorite',
+            constraint=models.UniqueConstraint(
+                fields=('user', 'favorite'), name='unique_favorite'),
+        ),
+        migrations.AddConstraint(
+            model_name='shoppingcart',
+            constraint=models.UniqueConstraint(
+                fields=('user', 'recipe'), name='unique_shopping_cart'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['author', 'pub_date', 'id'],
+                               name='recipe_author_pub_date_idx'),
+        ),
+    ]
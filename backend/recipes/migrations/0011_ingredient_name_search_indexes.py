@@ -0,0 +1,36 @@
+from django.db import migrations
+
+# Выражения совпадают с теми, что Django строит для istartswith
+# и icontains, поэтому индексы используются и поиском в админке.
+CREATE_INDEXES = (
+    'CREATE EXTENSION IF NOT EXISTS pg_trgm',
+    'CREATE INDEX IF NOT EXISTS ingredient_name_pattern_idx '
+    'ON recipes_ingredient (UPPER(name::text) text_pattern_ops)',
+    'CREATE INDEX IF NOT EXISTS ingredient_name_trgm_idx '
+    'ON recipes_ingredient USING gin (UPPER(name::text) gin_trgm_ops)',
+)
+DROP_INDEXES = (
+    'DROP INDEX IF EXISTS ingredient_name_trgm_idx',
+    'DROP INDEX IF EXISTS ingredient_name_pattern_idx',
+)
+
+
+def run_on_postgresql(statements):
+    def run(apps, schema_editor):
+        if schema_editor.connection.vendor != 'postgresql':
+            return
+        for statement in statements:
+            schema_editor.execute(statement)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0010_relation_constraints'),
+    ]
+
+    operations = [
+        migrations.RunPython(run_on_postgresql(CREATE_INDEXES),
+                             run_on_postgresql(DROP_INDEXES)),
+    ]
@@ -0,0 +1,17 @@
+from django.db import migrations, models
+import recipes.storage
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0013_feedentry'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='recipe',
+            name='image',
+            field=models.ImageField(blank=True, db_index=True, null=True, storage=recipes.storage.ContentAddressedStorage(), upload_to='recipe_images/', verbose_name='Картинка'),
+        ),
+    ]
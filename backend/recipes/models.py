@@ -1,7 +1,14 @@
 from django.db import models
+from django.db.models import Exists, F, OuterRef, Prefetch, Value, Window
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import RowNumber
 from django.contrib.auth import get_user_model
+from django.contrib.postgres.search import SearchVectorField
 from django.core.validators import MinValueValidator, MaxValueValidator
 
+from users.models import CounterFieldsMixin, Follow
+from .storage import ContentAddressedStorage
+
 User = get_user_model()
 MAX_COOKING_TIME = 32000
 MIN_COOKING_TIME = 1
@@ -39,9 +46,58 @@ class Tag(models.Model):
         return self.name
 
 
-class Recipe(models.Model):
+class RecipeQuerySet(models.QuerySet):
+    def with_user_data(self, user):
+        """
+        Подгружает связанные данные и флаги пользователя для списка рецептов.
+        """
+        queryset = self.select_related('author').prefetch_related(
+            'tags',
+            Prefetch('ingredientinrecipe_set',
+                     queryset=IngredientInRecipe.objects.select_related(
+                         'ingredient'))
+        )
+        if user.is_anonymous:
+            return queryset.annotate(
+                is_favorited=Value(False, output_field=models.BooleanField()),
+                is_in_shopping_cart=Value(
+                    False, output_field=models.BooleanField()),
+                author_is_subscribed=Value(
+                    False, output_field=models.BooleanField()),
+            )
+        return queryset.annotate(
+            is_favorited=Exists(Favorite.objects.filter(
+                user=user, favorite=OuterRef('pk'))),
+            is_in_shopping_cart=Exists(ShoppingCart.objects.filter(
+                user=user, recipe=OuterRef('pk'))),
+            author_is_subscribed=Exists(Follow.objects.filter(
+                user=user, following=OuterRef('author'))),
+        )
+
+    def limit_per_author(self, limit):
+        """
+        Оставляет не больше limit первых рецептов каждого автора.
+        Отбор делает ROW_NUMBER() в одном запросе, поэтому превью для
+        страницы подписок загружаются одним prefetch.
+        """
+        ranked = self.order_by().annotate(row_number=Window(
+            expression=RowNumber(),
+            partition_by=[F('author_id')],
+            order_by=[F('pub_date').asc(), F('id').asc()],
+        )).values('id', 'row_number')
+        sql, params = ranked.query.sql_with_params()
+        return self.filter(id__in=RawSQL(
+            f'SELECT ranked.id FROM ({sql}) ranked '
+            f'WHERE ranked.row_number <= %s',
+            (*params, limit),
+        ))
+
+
+class Recipe(CounterFieldsMixin, models.Model):
     pub_date = models.DateTimeField(auto_now_add=True,
                                     verbose_name='Дата публикации')
+    updated_at = models.DateTimeField(auto_now=True,
+                                      verbose_name='Дата изменения')
     author = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
@@ -50,8 +106,10 @@ class Recipe(models.Model):
     )
     name = models.CharField(max_length=255, verbose_name='Название')
     image = models.ImageField(upload_to='recipe_images/',
+                              storage=ContentAddressedStorage(),
                               blank=True,
                               null=True,
+                              db_index=True,
                               verbose_name='Картинка')
     text = models.TextField(verbose_name='Текст')
     cooking_time = models.PositiveSmallIntegerField(
@@ -70,15 +128,41 @@ class Recipe(models.Model):
                                          blank=False,
                                          verbose_name='Ингредиенты')
     tags = models.ManyToManyField(Tag, verbose_name='Теги')
+    favorites_count = models.PositiveIntegerField(
+        default=0, editable=False, verbose_name='В избранном')
+    in_carts_count = models.PositiveIntegerField(
+        default=0, editable=False, verbose_name='В корзинах')
+
+    # Поддерживается сигналом в PostgreSQL, GIN-индекс создан миграцией.
+    search_vector = SearchVectorField(null=True, editable=False,
+                                      verbose_name='Поисковый вектор')
+
+    counter_fields = ('favorites_count', 'in_carts_count')
+
+    objects = RecipeQuerySet.as_manager()
 
     class Meta:
         ordering = ('pub_date',)
+        indexes = (
+            models.Index(fields=('pub_date', 'id'),
+                         name='recipe_pub_date_id_idx'),
+            models.Index(fields=('author', 'pub_date', 'id'),
+                         name='recipe_author_pub_date_idx'),
+        )
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
 
     def __str__(self):
         return self.name
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Имя загруженной картинки: после замены старый файл удаляется,
+        # если на него больше не ссылается ни один рецепт.
+        instance.loaded_image = instance.__dict__.get('image')
+        return instance
+
 
 class IngredientInRecipe(models.Model):
     ingredient = models.ForeignKey(Ingredient,
@@ -99,6 +183,10 @@ class IngredientInRecipe(models.Model):
 
     class Meta:
         ordering = ('recipe',)
+        constraints = (
+            models.UniqueConstraint(fields=('recipe', 'ingredient'),
+                                    name='unique_ingredient_in_recipe'),
+        )
         verbose_name = 'Ингредиентов в рецепте'
         verbose_name_plural = 'Ингредиентов в рецепте'
 
@@ -106,6 +194,16 @@ class IngredientInRecipe(models.Model):
         return f'{self.ingredient.name} ({self.amount} ' \
                f'{self.ingredient.measurement_unit}) in {self.recipe.name}'
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Загруженные значения: при сохранении в списки покупок
+        # добавляется разница с ними.
+        instance.loaded_ingredient_id = instance.__dict__.get(
+            'ingredient_id')
+        instance.loaded_amount = instance.__dict__.get('amount')
+        return instance
+
 
 class Favorite(models.Model):
     user = models.ForeignKey(User,
@@ -120,6 +218,10 @@ class Favorite(models.Model):
 
     class Meta:
         ordering = ('user',)
+        constraints = (
+            models.UniqueConstraint(fields=('user', 'favorite'),
+                                    name='unique_favorite'),
+        )
         verbose_name = 'Избранное'
         verbose_name_plural = 'Избранное'
 
@@ -134,5 +236,50 @@ class ShoppingCart(models.Model):
 
     class Meta:
         ordering = ('user',)
+        constraints = (
+            models.UniqueConstraint(fields=('user', 'recipe'),
+                                    name='unique_shopping_cart'),
+        )
         verbose_name = 'Корзина покупок'
         verbose_name_plural = 'Корзина покупок'
+
+
+class ShoppingListItem(models.Model):
+    user = models.ForeignKey(User, on_delete=models.CASCADE,
+                             related_name='shopping_list',
+                             verbose_name='Пользователь')
+    ingredient = models.ForeignKey(Ingredient, on_delete=models.CASCADE,
+                                   verbose_name='Ингредиент')
+    total_amount = models.PositiveIntegerField(verbose_name='Количество')
+
+    class Meta:
+        ordering = ('user',)
+        constraints = (
+            models.UniqueConstraint(fields=('user', 'ingredient'),
+                                    name='unique_shopping_list_item'),
+        )
+        verbose_name = 'Список покупок'
+        verbose_name_plural = 'Списки покупок'
+
+
+class FeedEntry(models.Model):
+    user = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name='feed',
+        verbose_name='Пользователь')
+    recipe = models.ForeignKey(
+        Recipe, on_delete=models.CASCADE, related_name='feed_entries',
+        verbose_name='Рецепт')
+    pub_date = models.DateTimeField(verbose_name='Дата публикации')
+
+    class Meta:
+        ordering = ('-pub_date', '-recipe')
+        constraints = (
+            models.UniqueConstraint(fields=('user', 'recipe'),
+                                    name='unique_feed_entry'),
+        )
+        indexes = (
+            models.Index(fields=('user', 'pub_date', 'recipe'),
+                         name='feed_user_pub_date_idx'),
+        )
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Лента подписок'
@@ -0,0 +1,33 @@
+import json
+
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import DataAndFiles, MultiPartParser
+
+
+class MultiPartJSONParser(MultiPartParser):
+    """
+    multipart/form-data для рецептов: картинка приходит файлом и пишется
+    на диск по частям обработчиками загрузки Django, а вложенные
+    структуры передаются полями с JSON.
+    """
+    json_fields = ('tags', 'ingredients')
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        result = super().parse(stream, media_type, parser_context)
+        data = result.data.dict()
+        for field in self.json_fields:
+            values = result.data.getlist(field)
+            if len(values) != 1:
+                # Теги можно передать и повторяющимся полем: tags=1&tags=2.
+                if values:
+                    data[field] = values
+                continue
+            try:
+                value = json.loads(values[0])
+            except ValueError:
+                raise ParseError(f'Поле {field} должно содержать JSON')
+            # Одиночное поле tags=1 - это список из одного тега.
+            data[field] = value if isinstance(value, list) else [value]
+        # Обычные словари: Request сливает data и files через update,
+        # а MultiValueDict отдал бы списки значений.
+        return DataAndFiles(data, result.files.dict())
@@ -0,0 +1,75 @@
+from django.db import connection, transaction
+
+from .signals import handle_bulk_change
+
+
+def get_relation_columns(model, field):
+    opts = model._meta
+    target = opts.get_field(field)
+    return (opts.db_table, opts.get_field('user').column, target.column,
+            target.related_model._meta.db_table, target.target_field.column)
+
+
+def apply_relation_changes(model, user, field, target_ids, sign):
+    handle_bulk_change(
+        model, [model(user=user, **{f'{field}_id': target_id})
+                for target_id in target_ids],
+        sign=sign)
+
+
+def create_relations(model, user, field, target_ids):
+    """
+    Добавляет связи пользователя с объектами одним INSERT ... SELECT,
+    который пропускает дубликаты и несуществующие объекты.
+    RETURNING возвращает только действительно добавленные строки:
+    строку, которую параллельный запрос вставил раньше, побочные
+    эффекты второй раз не затрагивают. Возвращает множество id объектов.
+    """
+    qn = connection.ops.quote_name
+    table, user_column, column, target_table, target_column = (
+        get_relation_columns(model, field))
+    placeholders = ', '.join(['%s'] * len(target_ids))
+    sql = (
+        f'{connection.ops.insert_statement(ignore_conflicts=True)} '
+        f'{qn(table)} ({qn(user_column)}, {qn(column)}) '
+        f'SELECT %s, {qn(target_column)} FROM {qn(target_table)} '
+        f'WHERE {qn(target_column)} IN ({placeholders}) '
+        f'{connection.ops.ignore_conflicts_suffix_sql(ignore_conflicts=True)}'
+        f' RETURNING {qn(column)}'
+    )
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute(sql, (user.pk, *target_ids))
+            created = {row[0] for row in cursor.fetchall()}
+        apply_relation_changes(model, user, field, created, sign=1)
+    return created
+
+
+def delete_relations(model, user, field, target_ids):
+    """
+    Удаляет связи одним DELETE без обхода строк сигналами.
+    Возвращает множество id объектов, связи с которыми были удалены.
+    """
+    qn = connection.ops.quote_name
+    table, user_column, column, _, _ = get_relation_columns(model, field)
+    placeholders = ', '.join(['%s'] * len(target_ids))
+    sql = (f'DELETE FROM {qn(table)} '
+           f'WHERE {qn(user_column)} = %s '
+           f'AND {qn(column)} IN ({placeholders}) '
+           f'RETURNING {qn(column)}')
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute(sql, (user.pk, *target_ids))
+            deleted = {row[0] for row in cursor.fetchall()}
+        apply_relation_changes(model, user, field, deleted, sign=-1)
+    return deleted
+
+
+def create_relation(model, user, field, target_id):
+    """Добавляет одну связь. Возвращает True, если строка добавлена."""
+    return bool(create_relations(model, user, field, (target_id,)))
+
+
+def delete_relation(model, user, field, target_id):
+    """Удаляет одну связь. Возвращает True, если строка была."""
+    return bool(delete_relations(model, user, field, (target_id,)))
@@ -0,0 +1,287 @@
+import re
+from array import array
+from bisect import bisect_left, insort
+from collections import Counter, defaultdict
+from itertools import islice
+
+from django.conf import settings
+from django.contrib.postgres.search import (SearchQuery, SearchRank,
+                                            SearchVector)
+from django.db import connections, transaction
+from django.db.models import Case, F, FloatField, Value, When
+from rest_framework.response import Response
+
+from .cache import get_own_bumps, get_versions
+from .models import Ingredient, IngredientInRecipe, Recipe
+
+INGREDIENT_FIELDS = ('id', 'name', 'measurement_unit')
+COOKABLE_MODELS = (Recipe, IngredientInRecipe)
+NGRAM_SIZE = 2
+# Подсказка при вводе не показывает больше этого числа ингредиентов.
+MAX_INGREDIENT_RESULTS = 50
+TOKEN_RE = re.compile(r'\w+')
+# Как веса A и B в ts_rank по умолчанию.
+NAME_WEIGHT = 1.0
+TEXT_WEIGHT = 0.4
+
+_ingredient_index = None
+_recipe_text_index = None
+_cookable_index = None
+
+
+def normalize(name):
+    return name.lower().replace('ё', 'е')
+
+
+class IngredientIndex:
+    """
+    Неизменяемый индекс нормализованных названий ингредиентов.
+
+    Совпадения по началу названия ищутся бинарным поиском по
+    отсортированному списку. Для вхождений в середину хранятся списки
+    позиций по биграммам: проверяются только названия из самого
+    короткого списка среди биграмм запроса. Результат ограничен
+    MAX_INGREDIENT_RESULTS, поэтому короткий запрос не выдаёт весь
+    справочник.
+    """
+
+    def __init__(self, rows, version=None):
+        self.version = version
+        self.rows = sorted(rows, key=lambda row: normalize(row[1]))
+        self.names = [normalize(row[1]) for row in self.rows]
+        postings = defaultdict(list)
+        for index, name in enumerate(self.names):
+            for ngram in {name[i:i + NGRAM_SIZE]
+                          for i in range(len(name) - NGRAM_SIZE + 1)}:
+                postings[ngram].append(index)
+        self.postings = {ngram: array('l', indexes)
+                         for ngram, indexes in postings.items()}
+
+    def get_candidates(self, query):
+        return min(
+            (self.postings.get(query[i:i + NGRAM_SIZE], ())
+             for i in range(len(query) - NGRAM_SIZE + 1)),
+            key=len
+        )
+
+    def search(self, query, limit=MAX_INGREDIENT_RESULTS):
+        """
+        Не больше limit названий: сначала по началу, затем по вхождению.
+        Запрос короче биграммы ищется только по началу названия,
+        иначе пришлось бы проверять все названия. Пустой запрос
+        ничего не находит.
+        """
+        query = normalize(query.strip())
+        if not query:
+            return []
+
+        start = bisect_left(self.names, query)
+        end = bisect_left(self.names, query + chr(0x10ffff), start)
+        found = self.rows[start:min(end, start + limit)]
+        if len(query) < NGRAM_SIZE:
+            return found
+        found.extend(islice(
+            (self.rows[index] for index in self.get_candidates(query)
+             if not start <= index < end and query in self.names[index]),
+            limit - len(found)))
+        return found
+
+
+def get_ingredient_index():
+    """
+    Возвращает индекс ингредиентов текущего процесса и перестраивает его,
+    если версия Ingredient в кеше изменилась.
+    """
+    global _ingredient_index
+    version = get_versions((Ingredient,))[0]
+    if _ingredient_index is None or _ingredient_index.version != version:
+        _ingredient_index = IngredientIndex(
+            Ingredient.objects.values_list(*INGREDIENT_FIELDS), version)
+    return _ingredient_index
+
+
+class IngredientSearchMixin:
+    """
+    Поиск ингредиентов по ?name=: сначала совпадения по началу
+    названия, затем по вхождению.
+    """
+
+    def list(self, request, *args, **kwargs):
+        name = request.query_params.get('name', '').strip()
+        if not name:
+            return super().list(request, *args, **kwargs)
+        rows = get_ingredient_index().search(name)
+        serializer = self.get_serializer(
+            [dict(zip(INGREDIENT_FIELDS, row)) for row in rows], many=True)
+        return Response(serializer.data)
+
+
+def get_search_vector():
+    config = settings.SEARCH_CONFIG
+    return (SearchVector('name', weight='A', config=config)
+            + SearchVector('text', weight='B', config=config))
+
+
+def tokenize(value):
+    return TOKEN_RE.findall(normalize(value))
+
+
+class RecipeTextIndex:
+    """
+    Обратный индекс слов названий и описаний рецептов для баз без
+    tsvector (SQLite). Слово в названии весит больше, чем в тексте.
+    """
+
+    def __init__(self, rows, version=None):
+        self.version = version
+        postings = defaultdict(lambda: defaultdict(float))
+        for pk, name, text in rows:
+            for value, weight in ((name, NAME_WEIGHT), (text, TEXT_WEIGHT)):
+                for token in tokenize(value):
+                    postings[token][pk] += weight
+        self.postings = {token: dict(scores)
+                         for token, scores in postings.items()}
+
+    def search(self, query):
+        """Возвращает {id: вес} рецептов, в которых есть все слова."""
+        postings = sorted(
+            (self.postings.get(token, {}) for token in set(tokenize(query))),
+            key=len)
+        if not postings:
+            return {}
+        scores = dict(postings[0])
+        for posting in postings[1:]:
+            scores = {pk: score + posting[pk]
+                      for pk, score in scores.items() if pk in posting}
+        return scores
+
+
+def get_recipe_text_index():
+    global _recipe_text_index
+    version = get_versions((Recipe,))[0]
+    if _recipe_text_index is None or _recipe_text_index.version != version:
+        _recipe_text_index = RecipeTextIndex(
+            Recipe.objects.values_list('id', 'name', 'text').iterator(),
+            version)
+    return _recipe_text_index
+
+
+def search_recipes(queryset, query):
+    """
+    Полнотекстовый поиск рецептов с сортировкой по релевантности.
+    В PostgreSQL ищет по search_vector через GIN-индекс, в остальных
+    базах по индексу в памяти процесса.
+    """
+    if connections[queryset.db].vendor == 'postgresql':
+        search_query = SearchQuery(query, config=settings.SEARCH_CONFIG)
+        queryset = queryset.filter(search_vector=search_query).annotate(
+            rank=SearchRank(F('search_vector'), search_query))
+    else:
+        scores = get_recipe_text_index().search(query)
+        queryset = queryset.filter(pk__in=scores).annotate(rank=Case(
+            *(When(pk=pk, then=Value(score))
+              for pk, score in scores.items()),
+            default=Value(0.0), output_field=FloatField()))
+    return queryset.order_by('-rank', '-pub_date', '-id')
+
+
+class CookableIndex:
+    """
+    Обратный индекс ингредиент -> отсортированный массив id рецептов
+    и число ингредиентов каждого рецепта. По нему рецепты ранжируются
+    долей ингредиентов, которые уже есть у пользователя.
+    """
+
+    def __init__(self, rows, version=None):
+        self.version = version
+        postings = defaultdict(list)
+        self.counts = Counter()
+        for ingredient_id, recipe_id in rows:
+            postings[ingredient_id].append(recipe_id)
+            self.counts[recipe_id] += 1
+        self.postings = {ingredient_id: array('l', sorted(recipe_ids))
+                         for ingredient_id, recipe_ids in postings.items()}
+
+    def remove_recipe(self, recipe_id):
+        if not self.counts.pop(recipe_id, 0):
+            return
+        for recipe_ids in self.postings.values():
+            index = bisect_left(recipe_ids, recipe_id)
+            if index < len(recipe_ids) and recipe_ids[index] == recipe_id:
+                del recipe_ids[index]
+
+    def add_recipe(self, recipe_id, ingredient_ids):
+        for ingredient_id in ingredient_ids:
+            insort(self.postings.setdefault(ingredient_id, array('l')),
+                   recipe_id)
+        if ingredient_ids:
+            self.counts[recipe_id] = len(ingredient_ids)
+
+    def search(self, ingredient_ids):
+        """
+        Возвращает [(id рецепта, доля покрытия)]: сначала рецепты
+        с большей долей, при равной доле - с большим числом совпадений.
+        """
+        hits = Counter()
+        for ingredient_id in set(ingredient_ids):
+            hits.update(self.postings.get(ingredient_id, ()))
+        ranked = sorted(
+            hits.items(),
+            key=lambda item: (item[1] / self.counts[item[0]], item[1],
+                              item[0]),
+            reverse=True)
+        return [(recipe_id, count / self.counts[recipe_id])
+                for recipe_id, count in ranked]
+
+
+def get_cookable_versions():
+    return get_versions(COOKABLE_MODELS)
+
+
+def get_cookable_index():
+    """
+    Возвращает индекс текущего процесса. Изменения из других процессов
+    видны по версиям Recipe и IngredientInRecipe и ведут к перестройке.
+    """
+    global _cookable_index
+    version = get_cookable_versions()
+    if _cookable_index is None or _cookable_index.version != version:
+        _cookable_index = CookableIndex(
+            IngredientInRecipe.objects.order_by()
+            .values_list('ingredient_id', 'recipe_id').iterator(),
+            version)
+    return _cookable_index
+
+
+def update_cookable_index(recipe_id, ingredient_ids=()):
+    """
+    После коммита обновляет индекс процесса на месте: убирает рецепт
+    и добавляет заново с ingredient_ids (пустой список - удаление).
+    Новая версия принимается, только если она отличается от прежней
+    ровно на изменения этой транзакции. Иначе версии успел поднять
+    другой процесс, и индекс сбрасывается.
+    """
+    expected_version = get_cookable_versions()
+    own_bumps = get_own_bumps(COOKABLE_MODELS)
+
+    def apply():
+        global _cookable_index
+        index = _cookable_index
+        if index is None:
+            return
+        if index.version != expected_version:
+            _cookable_index = None
+            return
+        version = get_cookable_versions()
+        applied_version = [
+            value + bumps - bumps_before for value, bumps, bumps_before
+            in zip(expected_version, get_own_bumps(COOKABLE_MODELS),
+                   own_bumps)]
+        if version != applied_version:
+            _cookable_index = None
+            return
+        index.remove_recipe(recipe_id)
+        index.add_recipe(recipe_id, list(ingredient_ids))
+        index.version = version
+
+    transaction.on_commit(apply)
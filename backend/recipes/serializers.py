@@ -1,27 +1,35 @@
-import base64
+from collections import Counter
+from functools import cached_property, partial
 
-from django.core.files.base import ContentFile
 from django.db import transaction
 from rest_framework import serializers
 
 from users.serializers import CustomUserSerializer
-from .models import (Recipe, IngredientInRecipe, Ingredient,
-                     Tag, Favorite, ShoppingCart)
+from .cache import bump_version
+from .images import (ThumbnailsField, check_image_size,
+                     decode_base64_image)
+from .models import Recipe, IngredientInRecipe, Ingredient, Tag
+from .search import update_cookable_index
+from .shopping_list import change_shopping_lists
+from .similar import record_similar_change
+from .snapshots import get_snapshot
 
 MIN_AMOUNT = 1
 MAX_AMOUNT = 32000
 MAX_COOKING_TIME = 32000
 MIN_COOKING_TIME = 1
+MAX_BULK_RECIPES = 100
+MAX_COOKABLE_INGREDIENTS = 100
+DEFAULT_SIMILAR = 10
+MAX_SIMILAR = 50
 
 
 class Base64ImageField(serializers.ImageField):
     def to_internal_value(self, data):
-        if data.startswith('data:image'):
-            img_format, img_str = data.split(';base64,')
-            ext = img_format.split('/')[-1]
-
-            data = ContentFile(base64.b64decode(img_str),
-                               name=f'uploaded_image.{ext}')
+        if isinstance(data, str) and data.startswith('data:image'):
+            data = decode_base64_image(data)
+        elif hasattr(data, 'size'):
+            check_image_size(data.size)
 
         return super().to_internal_value(data)
 
@@ -49,8 +57,55 @@ class IngredientInRecipeSerializer(serializers.ModelSerializer):
         fields = ('id', 'name', 'measurement_unit', 'amount')
 
 
+def get_objects_by_ids(queryset, ids):
+    """
+    Загружает объекты списка id одним in_bulk. Несуществующие
+    и повторяющиеся id возвращаются одной ошибкой.
+    """
+    objects = queryset.in_bulk(ids)
+    errors = []
+    missing = sorted(set(ids) - objects.keys())
+    if missing:
+        errors.append('Не найдены id: ' + ', '.join(map(str, missing)))
+    duplicates = sorted(pk for pk, count in Counter(ids).items() if count > 1)
+    if duplicates:
+        errors.append('Повторяются id: ' + ', '.join(map(str, duplicates)))
+    if errors:
+        raise serializers.ValidationError(errors)
+    return objects
+
+
+class PrimaryKeyListField(serializers.ListField):
+    """Список id, который загружается одним запросом."""
+
+    def __init__(self, queryset, **kwargs):
+        self.queryset = queryset
+        kwargs['child'] = serializers.IntegerField()
+        super().__init__(**kwargs)
+
+    def to_internal_value(self, data):
+        ids = super().to_internal_value(data)
+        objects = get_objects_by_ids(self.queryset.all(), ids)
+        return [objects[pk] for pk in ids]
+
+    def to_representation(self, value):
+        return [obj.pk for obj in value.all()]
+
+
+class AddIngredientListSerializer(serializers.ListSerializer):
+    """Подставляет ингредиенты всего списка одним запросом."""
+
+    def to_internal_value(self, data):
+        items = super().to_internal_value(data)
+        ingredients = get_objects_by_ids(Ingredient.objects.all(),
+                                         [item['id'] for item in items])
+        for item in items:
+            item['id'] = ingredients[item['id']]
+        return items
+
+
 class AddIngredientSerializer(serializers.ModelSerializer):
-    id = serializers.PrimaryKeyRelatedField(queryset=Ingredient.objects.all())
+    id = serializers.IntegerField()
     amount = serializers.IntegerField(
         min_value=MIN_AMOUNT,
         max_value=MAX_AMOUNT,
@@ -63,11 +118,11 @@ class AddIngredientSerializer(serializers.ModelSerializer):
     class Meta:
         model = IngredientInRecipe
         fields = ('id', 'amount')
+        list_serializer_class = AddIngredientListSerializer
 
 
 class RecipeSerializer(serializers.ModelSerializer):
-    tags = serializers.PrimaryKeyRelatedField(queryset=Tag.objects.all(),
-                                              many=True)
+    tags = PrimaryKeyListField(queryset=Tag.objects.all())
     ingredients = AddIngredientSerializer(many=True,
                                           source='ingredientinrecipe_set')
     image = Base64ImageField(write_only=True, required=False)
@@ -91,8 +146,6 @@ class RecipeSerializer(serializers.ModelSerializer):
         if not tags:
             raise serializers.ValidationError({'tags': 'Нужно выбрать '
                                                        'хотя бы один тег!'})
-        if len(tags) != len(set(tags)):
-            raise serializers.ValidationError({'tags': 'Теги не уникальны!'})
         return data
 
     def create(self, validated_data):
@@ -105,30 +158,83 @@ class RecipeSerializer(serializers.ModelSerializer):
             recipe.tags.add(*tags_data)
 
             self.create_or_update_ingredients(recipe, ingredients_data)
+            update_cookable_index(recipe.pk, [
+                ingredient['id'].pk for ingredient in ingredients_data])
+            record_similar_change(recipe.pk)
 
             return recipe
 
     def update(self, instance, validated_data):
+        """
+        Записывает только изменения: поля рецепта через update_fields,
+        ингредиенты и теги по разнице с текущими. Если ничего
+        не изменилось, запросов на запись нет.
+        """
         with transaction.atomic():
             tags_data = validated_data.pop('tags')
             ingredients_data = validated_data.pop('ingredientinrecipe_set')
 
-            # Обновление общих полей рецепта
-            instance.name = validated_data.get('name', instance.name)
-            instance.text = validated_data.get('text', instance.text)
-            instance.text = validated_data.get('image', instance.image)
-            instance.cooking_time = validated_data.get('cooking_time',
-                                                       instance.cooking_time)
-            instance.save()
+            update_fields = []
+            for field, value in validated_data.items():
+                if field == 'image' or getattr(instance, field) != value:
+                    setattr(instance, field, value)
+                    update_fields.append(field)
 
-            instance.tags.set(tags_data)
+            tags_changed = (set(instance.tags.values_list('pk', flat=True))
+                            != {tag.pk for tag in tags_data})
+            if tags_changed:
+                instance.tags.set(tags_data)
 
-            instance.ingredientinrecipe_set.all().delete()
+            ingredients_changed = self.update_ingredients(instance,
+                                                          ingredients_data)
 
-            self.create_or_update_ingredients(instance, ingredients_data)
+            if update_fields or tags_changed or ingredients_changed:
+                instance.save(update_fields=update_fields + ['updated_at'])
+            if ingredients_changed:
+                update_cookable_index(instance.pk, [
+                    ingredient['id'].pk for ingredient in ingredients_data])
+                record_similar_change(instance.pk)
 
             return instance
 
+    def update_ingredients(self, recipe, ingredients_data):
+        """
+        Сводит ингредиенты рецепта к ingredients_data: меняет количество
+        у оставшихся строк, удаляет лишние и добавляет новые.
+        bulk_update и bulk_create не отправляют сигналов, поэтому версия
+        и списки покупок для них обновляются здесь; удалённые строки
+        вычитает из списков покупок сигнал post_delete.
+        Возвращает True, если что-то изменилось.
+        """
+        existing = {row.ingredient_id: row
+                    for row in recipe.ingredientinrecipe_set.all()}
+        old_amounts = {pk: row.amount for pk, row in existing.items()}
+        new_amounts = {ingredient['id'].pk: ingredient['amount']
+                       for ingredient in ingredients_data}
+
+        changed = [row for pk, row in existing.items()
+                   if pk in new_amounts and row.amount != new_amounts[pk]]
+        removed = [row.pk for pk, row in existing.items()
+                   if pk not in new_amounts]
+        added = [ingredient for ingredient in ingredients_data
+                 if ingredient['id'].pk not in existing]
+        deltas = {pk: amount - old_amounts.get(pk, 0)
+                  for pk, amount in new_amounts.items()}
+        if not (changed or removed or added):
+            return False
+
+        for row in changed:
+            row.amount = new_amounts[row.ingredient_id]
+        IngredientInRecipe.objects.bulk_update(changed, ('amount',))
+        if removed:
+            IngredientInRecipe.objects.filter(pk__in=removed).delete()
+        self.create_or_update_ingredients(recipe, added)
+
+        transaction.on_commit(partial(bump_version, IngredientInRecipe))
+        change_shopping_lists(
+            recipe.shopping_cart.values_list('user_id', flat=True), deltas)
+        return True
+
     def create_or_update_ingredients(self, recipe, ingredients_data):
         ingredient_instances = [
             IngredientInRecipe(
@@ -145,49 +251,79 @@ class RecipeSerializer(serializers.ModelSerializer):
 class RecipeListSerializer(serializers.ModelSerializer):
     ingredients = IngredientInRecipeSerializer(many=True,
                                                source='ingredientinrecipe_set')
-    tags = TagSerializer(many=True, read_only=True)
+    tags = serializers.SerializerMethodField()
     author = CustomUserSerializer(many=False, read_only=True)
     is_favorited = serializers.SerializerMethodField()
     is_in_shopping_cart = serializers.SerializerMethodField()
+    thumbnails = ThumbnailsField(source='image')
 
     class Meta:
         model = Recipe
         fields = ('id', 'tags', 'author', 'ingredients',
                   'is_favorited', 'is_in_shopping_cart',
-                  'name', 'image', 'text', 'cooking_time')
+                  'name', 'image', 'thumbnails', 'text', 'cooking_time')
+
+    def to_representation(self, instance):
+        # Подписка на автора вычисляется в запросе сразу для всей страницы.
+        instance.author.is_subscribed = instance.author_is_subscribed
+        return super().to_representation(instance)
+
+    @cached_property
+    def tags_by_id(self):
+        return get_snapshot(Tag, TagSerializer).data_by_id
+
+    def get_tags(self, obj):
+        return [self.tags_by_id.get(tag.pk) or TagSerializer(tag).data
+                for tag in obj.tags.all()]
 
     def get_is_favorited(self, obj):
-        user = self.context['request'].user
-        return obj.favorite.filter(user=user).exists()
+        return obj.is_favorited
 
     def get_is_in_shopping_cart(self, obj):
-        user = self.context['request'].user
-        return obj.shopping_cart.filter(user=user).exists()
+        return obj.is_in_shopping_cart
 
 
 class FavoriteRecipeSerializer(serializers.ModelSerializer):
+    thumbnails = ThumbnailsField(source='image')
+
     class Meta:
         model = Recipe
-        fields = ('id', 'name', 'image', 'cooking_time')
+        fields = ('id', 'name', 'image', 'thumbnails', 'cooking_time')
 
 
-class FavoriteSerializer(serializers.ModelSerializer):
-    class Meta:
-        model = Favorite
-        fields = ('user', 'favorite')
-        read_only_fields = ('user', 'favorite')
+class CookableRecipeSerializer(RecipeListSerializer):
+    coverage = serializers.FloatField(read_only=True)
 
-    def to_representation(self, instance):
-        return FavoriteRecipeSerializer(instance.favorite,
-                                        context=self.context).data
+    class Meta(RecipeListSerializer.Meta):
+        fields = RecipeListSerializer.Meta.fields + ('coverage',)
 
 
-class ShoppingCartSerializer(serializers.ModelSerializer):
-    class Meta:
-        model = ShoppingCart
-        fields = ('user', 'recipe')
-        read_only_fields = ('user', 'recipe')
+class SimilarRecipeSerializer(RecipeListSerializer):
+    similarity = serializers.FloatField(read_only=True)
 
-    def to_representation(self, instance):
-        return FavoriteRecipeSerializer(instance.recipe,
-                                        context=self.context).data
+    class Meta(RecipeListSerializer.Meta):
+        fields = RecipeListSerializer.Meta.fields + ('similarity',)
+
+
+class SimilarQuerySerializer(serializers.Serializer):
+    limit = serializers.IntegerField(min_value=1, max_value=MAX_SIMILAR,
+                                     default=DEFAULT_SIMILAR)
+
+
+class CookableQuerySerializer(serializers.Serializer):
+    ingredients = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=MAX_COOKABLE_INGREDIENTS,
+    )
+
+
+class BulkRecipeIdsSerializer(serializers.Serializer):
+    recipes = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=MAX_BULK_RECIPES,
+        error_messages={
+            'max_length': f'Не больше {MAX_BULK_RECIPES} рецептов за раз'
+        }
+    )
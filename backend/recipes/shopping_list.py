@@ -0,0 +1,157 @@
+import hashlib
+import os
+from io import BytesIO
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Sum
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.units import mm
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.pdfgen import canvas
+
+from .cache import get_versions
+from .models import (Ingredient, IngredientInRecipe, ShoppingCart,
+                     ShoppingListItem)
+
+User = get_user_model()
+
+PDF_KEY = 'shopping_list_pdf:{}:{}'
+PDF_FONT = 'ShoppingListFont'
+PDF_FONT_SIZE = 12
+PDF_MARGIN = 20 * mm
+PDF_LINE_HEIGHT = 7 * mm
+
+
+def get_shopping_list(user):
+    """
+    Читает готовый список покупок пользователя, объединяя ингредиенты
+    с одинаковыми названием и единицей измерения.
+    """
+    return (ShoppingListItem.objects
+            .filter(user=user)
+            .values('ingredient__name', 'ingredient__measurement_unit')
+            .annotate(amount=Sum('total_amount'))
+            .order_by('ingredient__name', 'ingredient__measurement_unit'))
+
+
+def compute_shopping_list_totals():
+    """
+    Полный пересчёт списков покупок всех пользователей по корзинам:
+    {(user_id, ingredient_id): количество}.
+    """
+    totals = (IngredientInRecipe.objects
+              .filter(recipe__shopping_cart__isnull=False)
+              .values_list('recipe__shopping_cart__user', 'ingredient')
+              .annotate(total_amount=Sum('amount')).order_by())
+    return {(user_id, ingredient_id): total_amount
+            for user_id, ingredient_id, total_amount in totals.iterator()}
+
+
+def get_recipe_amounts(recipe_id):
+    return dict(IngredientInRecipe.objects.filter(recipe=recipe_id)
+                .values_list('ingredient', 'amount'))
+
+
+def change_shopping_lists(user_ids, deltas):
+    """
+    Прибавляет deltas {ingredient_id: изменение количества} к спискам
+    покупок пользователей и удаляет обнулившиеся строки.
+    """
+    deltas = {pk: delta for pk, delta in deltas.items() if delta}
+    user_ids = list(user_ids)
+    if not deltas or not user_ids:
+        return
+
+    with transaction.atomic():
+        # Блокировка пользователей упорядочивает параллельные изменения
+        # их списков, иначе две транзакции могут создать одну строку.
+        list(User.objects.select_for_update().filter(pk__in=user_ids)
+             .order_by('pk').values_list('pk', flat=True))
+        items = {
+            (item.user_id, item.ingredient_id): item
+            for item in ShoppingListItem.objects.filter(
+                user__in=user_ids, ingredient__in=deltas).order_by()
+        }
+        to_create, to_update, to_delete = [], [], []
+        for user_id in user_ids:
+            for ingredient_id, delta in deltas.items():
+                item = items.get((user_id, ingredient_id))
+                if item is None:
+                    if delta > 0:
+                        to_create.append(ShoppingListItem(
+                            user_id=user_id, ingredient_id=ingredient_id,
+                            total_amount=delta))
+                    continue
+                item.total_amount += delta
+                if item.total_amount > 0:
+                    to_update.append(item)
+                else:
+                    to_delete.append(item.pk)
+
+        ShoppingListItem.objects.bulk_create(to_create)
+        ShoppingListItem.objects.bulk_update(to_update, ('total_amount',))
+        ShoppingListItem.objects.filter(pk__in=to_delete).delete()
+
+
+def render_text(shopping_list):
+    yield 'Список покупок:\n\n'
+    for item in shopping_list.iterator():
+        yield (f'{item["ingredient__name"]} '
+               f'({item["ingredient__measurement_unit"]}) — '
+               f'{item["amount"]}\n')
+
+
+def get_pdf_font():
+    if PDF_FONT in pdfmetrics.getRegisteredFontNames():
+        return PDF_FONT
+    if not os.path.exists(settings.SHOPPING_LIST_FONT):
+        # Встроенные шрифты PDF не содержат кириллицы.
+        return 'Helvetica'
+    pdfmetrics.registerFont(TTFont(PDF_FONT, settings.SHOPPING_LIST_FONT))
+    return PDF_FONT
+
+
+def render_pdf(shopping_list):
+    """
+    Рисует список построчно на холсте reportlab, не собирая
+    промежуточных объектов для всего списка.
+    """
+    buffer = BytesIO()
+    font = get_pdf_font()
+    pdf = canvas.Canvas(buffer, pagesize=A4)
+    width, height = A4
+    pdf.setFont(font, PDF_FONT_SIZE)
+    y = height - PDF_MARGIN
+    for line in render_text(shopping_list):
+        line = line.rstrip('\n')
+        if y < PDF_MARGIN:
+            pdf.showPage()
+            pdf.setFont(font, PDF_FONT_SIZE)
+            y = height - PDF_MARGIN
+        if line:
+            pdf.drawString(PDF_MARGIN, y, line)
+        y -= PDF_LINE_HEIGHT
+    pdf.save()
+    return buffer.getvalue()
+
+
+def get_shopping_list_pdf(user):
+    """
+    Возвращает PDF из кеша, пока не изменились корзина пользователя
+    и состав ингредиентов рецептов.
+    """
+    versions = (get_versions((ShoppingCart,), scope=user.pk)
+                + get_versions((IngredientInRecipe, Ingredient)))
+    stamp = hashlib.md5(
+        ':'.join(str(version) for version in versions).encode()
+    ).hexdigest()
+    key = PDF_KEY.format(user.pk, stamp)
+    content = cache.get(key)
+    if content is None:
+        content = render_pdf(get_shopping_list(user))
+        cache.set(key, content, settings.RESPONSE_CACHE_TIMEOUT)
+    return content
@@ -0,0 +1,255 @@
+from collections import Counter, defaultdict
+from functools import partial
+
+from django.contrib.auth import get_user_model
+from django.db import connections, transaction
+from django.db.models import F, Sum
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.utils import timezone
+
+from users.models import Follow
+from .cache import bump_version
+from .feed import backfill_feed, fan_out_recipe, prune_feed
+from .images import release_image, try_generate_thumbnails
+from .models import (Favorite, Ingredient, IngredientInRecipe, Recipe,
+                     ShoppingCart, Tag)
+from .search import get_search_vector, update_cookable_index
+from .shopping_list import change_shopping_lists, get_recipe_amounts
+from .similar import record_similar_change
+
+User = get_user_model()
+VERSIONED_MODELS = (Recipe, IngredientInRecipe, Tag, Ingredient, User)
+USER_VERSIONED_MODELS = (Favorite, ShoppingCart, Follow)
+# Модель связи: (модель со счётчиком, внешний ключ, поле счётчика).
+COUNTERS = {
+    Recipe: (User, 'author_id', 'recipes_count'),
+    Follow: (User, 'following_id', 'followers_count'),
+    Favorite: (Recipe, 'favorite_id', 'favorites_count'),
+    ShoppingCart: (Recipe, 'recipe_id', 'in_carts_count'),
+}
+
+
+def invalidate(sender, **kwargs):
+    update_fields = kwargs.get('update_fields')
+    if update_fields and set(update_fields) == {'last_login'}:
+        return
+    # Версия поднимается после коммита, иначе параллельный запрос может
+    # закешировать ещё не закоммиченное состояние под новой версией.
+    transaction.on_commit(partial(bump_version, sender))
+
+
+def invalidate_user(sender, instance, **kwargs):
+    transaction.on_commit(partial(bump_version, sender,
+                                  scope=instance.user_id))
+
+
+def touch_recipe_ingredients(sender, instance, **kwargs):
+    Recipe.objects.filter(pk=instance.recipe_id).update(
+        updated_at=timezone.now())
+
+
+def update_counter(sender, instance, delta):
+    model, foreign_key, field = COUNTERS[sender]
+    model.objects.filter(pk=getattr(instance, foreign_key)).update(
+        **{field: F(field) + delta})
+
+
+def increment_counter(sender, instance, created, **kwargs):
+    if created:
+        update_counter(sender, instance, 1)
+
+
+def decrement_counter(sender, instance, **kwargs):
+    update_counter(sender, instance, -1)
+
+
+def handle_bulk_change(model, instances, sign=1):
+    """
+    bulk_create и запросы в обход моделей не отправляют сигналов,
+    поэтому счётчики, версии, ленты и списки покупок для созданных (sign=1)
+    или удалённых (sign=-1) объектов обновляются здесь.
+    """
+    counter_model, foreign_key, field = COUNTERS[model]
+    targets = defaultdict(list)
+    for pk, count in Counter(getattr(instance, foreign_key)
+                             for instance in instances).items():
+        targets[count * sign].append(pk)
+    for delta, pks in targets.items():
+        counter_model.objects.filter(pk__in=pks).update(
+            **{field: F(field) + delta})
+
+    targets_by_user = defaultdict(list)
+    for instance in instances:
+        targets_by_user[instance.user_id].append(
+            getattr(instance, foreign_key))
+    for user_id, target_ids in targets_by_user.items():
+        transaction.on_commit(partial(bump_version, model, scope=user_id))
+        if model is Follow:
+            change_feed = backfill_feed if sign > 0 else prune_feed
+            change_feed(user_id, target_ids)
+        if model is ShoppingCart:
+            amounts = (IngredientInRecipe.objects
+                       .filter(recipe__in=target_ids)
+                       .values_list('ingredient').annotate(Sum('amount'))
+                       .order_by())
+            change_shopping_lists(
+                (user_id,),
+                {pk: amount * sign for pk, amount in amounts})
+
+
+def add_to_shopping_list(sender, instance, created, **kwargs):
+    if created:
+        change_shopping_lists((instance.user_id,),
+                              get_recipe_amounts(instance.recipe_id))
+
+
+def remove_from_shopping_list(sender, instance, **kwargs):
+    # При каскадном удалении рецепта ингредиенты, удалённые раньше
+    # корзины, уже вычел update_shopping_lists_on_delete.
+    amounts = get_recipe_amounts(instance.recipe_id)
+    change_shopping_lists((instance.user_id,),
+                          {pk: -amount for pk, amount in amounts.items()})
+
+
+def get_cart_user_ids(recipe_id):
+    return ShoppingCart.objects.filter(recipe=recipe_id).values_list(
+        'user_id', flat=True)
+
+
+def update_shopping_lists_on_save(sender, instance, created, **kwargs):
+    """
+    Изменение ингредиента рецепта в обход RecipeSerializer (например,
+    в админке) переносится в списки покупок корзин с этим рецептом.
+    """
+    deltas = Counter({instance.ingredient_id: instance.amount})
+    loaded_ingredient_id = getattr(instance, 'loaded_ingredient_id', None)
+    if not created and loaded_ingredient_id is not None:
+        deltas[loaded_ingredient_id] -= instance.loaded_amount
+    change_shopping_lists(get_cart_user_ids(instance.recipe_id), deltas)
+    instance.loaded_ingredient_id = instance.ingredient_id
+    instance.loaded_amount = instance.amount
+
+
+def update_shopping_lists_on_delete(sender, instance, **kwargs):
+    # При каскадном удалении рецепта корзины могут быть уже удалены,
+    # тогда их списки уменьшил remove_from_shopping_list.
+    change_shopping_lists(get_cart_user_ids(instance.recipe_id),
+                          {instance.ingredient_id: -instance.amount})
+
+
+def add_recipe_to_feeds(sender, instance, created, **kwargs):
+    if created:
+        fan_out_recipe(instance)
+
+
+def update_search_vector(sender, instance, using, update_fields=None,
+                         **kwargs):
+    if connections[using].vendor != 'postgresql':
+        return
+    if update_fields is not None and not {'name', 'text'} & set(update_fields):
+        return
+    Recipe.objects.using(using).filter(pk=instance.pk).update(
+        search_vector=get_search_vector())
+
+
+def create_thumbnails(sender, instance, **kwargs):
+    if instance.image:
+        transaction.on_commit(partial(try_generate_thumbnails,
+                                      instance.image.name))
+
+
+def remove_from_cookable_index(sender, instance, **kwargs):
+    update_cookable_index(instance.pk)
+
+
+def update_similar_index(sender, instance, **kwargs):
+    record_similar_change(instance.recipe_id)
+
+
+def release_replaced_image(sender, instance, **kwargs):
+    loaded_image = getattr(instance, 'loaded_image', None)
+    if loaded_image and loaded_image != instance.image.name:
+        transaction.on_commit(partial(release_image, loaded_image))
+    instance.loaded_image = instance.image.name
+
+
+def release_deleted_image(sender, instance, **kwargs):
+    if instance.image:
+        transaction.on_commit(partial(release_image, instance.image.name))
+
+
+def add_follow_to_feed(sender, instance, created, **kwargs):
+    if created:
+        backfill_feed(instance.user_id, (instance.following_id,))
+
+
+def remove_follow_from_feed(sender, instance, **kwargs):
+    prune_feed(instance.user_id, (instance.following_id,))
+
+
+def invalidate_recipe_tags(sender, instance, action, reverse, pk_set,
+                           **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if reverse:
+        recipes = Recipe.objects.filter(pk__in=pk_set or ())
+    else:
+        recipes = Recipe.objects.filter(pk=instance.pk)
+    recipes.update(updated_at=timezone.now())
+    transaction.on_commit(partial(bump_version, Recipe))
+
+
+for model in VERSIONED_MODELS:
+    post_save.connect(invalidate, sender=model,
+                      dispatch_uid=f'invalidate_save_{model.__name__}')
+    post_delete.connect(invalidate, sender=model,
+                        dispatch_uid=f'invalidate_delete_{model.__name__}')
+
+for model in USER_VERSIONED_MODELS:
+    post_save.connect(invalidate_user, sender=model,
+                      dispatch_uid=f'invalidate_user_save_{model.__name__}')
+    post_delete.connect(
+        invalidate_user, sender=model,
+        dispatch_uid=f'invalidate_user_delete_{model.__name__}')
+
+for model in COUNTERS:
+    post_save.connect(increment_counter, sender=model,
+                      dispatch_uid=f'increment_counter_{model.__name__}')
+    post_delete.connect(decrement_counter, sender=model,
+                        dispatch_uid=f'decrement_counter_{model.__name__}')
+
+post_save.connect(add_to_shopping_list, sender=ShoppingCart,
+                  dispatch_uid='add_to_shopping_list')
+post_delete.connect(remove_from_shopping_list, sender=ShoppingCart,
+                    dispatch_uid='remove_from_shopping_list')
+post_save.connect(update_shopping_lists_on_save, sender=IngredientInRecipe,
+                  dispatch_uid='update_shopping_lists_on_save')
+post_delete.connect(update_shopping_lists_on_delete,
+                    sender=IngredientInRecipe,
+                    dispatch_uid='update_shopping_lists_on_delete')
+post_save.connect(add_recipe_to_feeds, sender=Recipe,
+                  dispatch_uid='add_recipe_to_feeds')
+post_save.connect(update_search_vector, sender=Recipe,
+                  dispatch_uid='update_search_vector')
+post_save.connect(create_thumbnails, sender=Recipe,
+                  dispatch_uid='create_thumbnails')
+post_delete.connect(remove_from_cookable_index, sender=Recipe,
+                    dispatch_uid='remove_from_cookable_index')
+post_save.connect(update_similar_index, sender=IngredientInRecipe,
+                  dispatch_uid='update_similar_index_on_save')
+post_delete.connect(update_similar_index, sender=IngredientInRecipe,
+                    dispatch_uid='update_similar_index_on_delete')
+post_save.connect(release_replaced_image, sender=Recipe,
+                  dispatch_uid='release_replaced_image')
+post_delete.connect(release_deleted_image, sender=Recipe,
+                    dispatch_uid='release_deleted_image')
+post_save.connect(add_follow_to_feed, sender=Follow,
+                  dispatch_uid='add_follow_to_feed')
+post_delete.connect(remove_follow_from_feed, sender=Follow,
+                    dispatch_uid='remove_follow_from_feed')
+post_save.connect(touch_recipe_ingredients, sender=IngredientInRecipe,
+                  dispatch_uid='touch_recipe_ingredients_save')
+post_delete.connect(touch_recipe_ingredients, sender=IngredientInRecipe,
+                    dispatch_uid='touch_recipe_ingredients_delete')
+m2m_changed.connect(invalidate_recipe_tags, sender=Recipe.tags.through,
+                    dispatch_uid='invalidate_recipe_tags')
@@ -0,0 +1,286 @@
+import os
+import time
+from functools import partial
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import IngredientInRecipe
+
+NUM_PERMUTATIONS = 128
+BANDS = 32
+ROWS_PER_BAND = NUM_PERMUTATIONS // BANDS
+MERSENNE_PRIME = (1 << 31) - 1
+# Строк IngredientInRecipe на один шаг векторного вычисления подписей.
+CHUNK_ROWS = 20000
+# После стольких изменённых рецептов ленточные массивы пересобираются.
+MAX_PENDING = 1000
+# Журнал изменённых рецептов в общем кеше: счётчик записей и записи
+# по номерам. Процесс, отставший дальше, чем хранятся записи, строит
+# индекс заново.
+CHANGES_KEY = 'similar:changes'
+CHANGE_KEY = 'similar:change:{}'
+CHANGE_TIMEOUT = 24 * 60 * 60
+
+# Коэффициенты хеш-функций фиксированы: подписи из файла индекса
+# и посчитанные процессом должны совпадать.
+_random = np.random.RandomState(20231016)
+HASH_A = _random.randint(1, MERSENNE_PRIME, NUM_PERMUTATIONS,
+                         dtype=np.int64)
+HASH_B = _random.randint(0, MERSENNE_PRIME, NUM_PERMUTATIONS,
+                         dtype=np.int64)
+BAND_MULTIPLIERS = (_random.randint(1, 1 << 62, ROWS_PER_BAND,
+                                    dtype=np.int64) * 2 + 1).astype(np.uint64)
+
+_similar_index = None
+
+
+def compute_signatures(rows):
+    """
+    MinHash-подписи рецептов по строкам (recipe_id, ingredient_id),
+    отсортированным по recipe_id. Возвращает (id рецептов, подписи).
+    """
+    rows = np.asarray(rows, dtype=np.int64).reshape(-1, 2)
+    if not len(rows):
+        return (np.empty(0, dtype=np.int64),
+                np.empty((0, NUM_PERMUTATIONS), dtype=np.uint32))
+    recipe_ids, starts = np.unique(rows[:, 0], return_index=True)
+    bounds = np.append(starts, len(rows))
+    signatures = np.empty((len(recipe_ids), NUM_PERMUTATIONS),
+                          dtype=np.uint32)
+    first = 0
+    while first < len(recipe_ids):
+        # Кусок из целых рецептов, примерно по CHUNK_ROWS строк.
+        last = max(first + 1, int(np.searchsorted(
+            bounds, bounds[first] + CHUNK_ROWS, side='right')) - 1)
+        last = min(last, len(recipe_ids))
+        ingredients = rows[bounds[first]:bounds[last], 1]
+        hashes = (ingredients[:, None] * HASH_A + HASH_B) % MERSENNE_PRIME
+        signatures[first:last] = np.minimum.reduceat(
+            hashes, bounds[first:last] - bounds[first], axis=0)
+        first = last
+    return recipe_ids, signatures
+
+
+def get_band_keys(signatures):
+    """Ключ каждой ленты подписи одним 64-битным числом: (n, BANDS)."""
+    bands = signatures.reshape(len(signatures), BANDS, ROWS_PER_BAND)
+    return (bands.astype(np.uint64) * BAND_MULTIPLIERS).sum(
+        axis=2, dtype=np.uint64)
+
+
+def get_change_number():
+    """
+    Номер последней записи журнала. Отсутствующий счётчик заводится
+    от текущего времени, как версии моделей: после вытеснения номера
+    не начинаются заново.
+    """
+    number = cache.get(CHANGES_KEY)
+    if number is None:
+        cache.add(CHANGES_KEY, time.time_ns(), timeout=None)
+        number = cache.get(CHANGES_KEY)
+    return number
+
+
+def append_change(recipe_id):
+    try:
+        number = cache.incr(CHANGES_KEY)
+    except ValueError:
+        get_change_number()
+        number = cache.incr(CHANGES_KEY)
+    cache.set(CHANGE_KEY.format(number), recipe_id, CHANGE_TIMEOUT)
+
+
+def record_similar_change(recipe_id):
+    """
+    После коммита записывает рецепт с изменённым составом в журнал:
+    индексы всех процессов пересчитают только его подпись.
+    """
+    transaction.on_commit(partial(append_change, recipe_id))
+
+
+def load_rows(recipe_ids=None):
+    rows = IngredientInRecipe.objects.order_by('recipe_id', 'ingredient_id')
+    if recipe_ids is not None:
+        rows = rows.filter(recipe__in=recipe_ids)
+    return np.fromiter(
+        (value for row in rows.values_list('recipe_id', 'ingredient_id')
+         .iterator() for value in row),
+        dtype=np.int64)
+
+
+class SimilarIndex:
+    """
+    Индекс похожих рецептов по MinHash-подписям множеств ингредиентов
+    с LSH по лентам. Всё хранится в массивах NumPy: id рецептов по
+    возрастанию, подписи и отсортированные ключи каждой ленты.
+    Изменённые рецепты до пересборки лежат в pending. change_number -
+    последняя учтённая запись журнала изменений.
+    """
+
+    def __init__(self, recipe_ids, signatures, change_number=None):
+        self.change_number = change_number
+        self.recipe_ids = recipe_ids
+        self.signatures = signatures
+        self.alive = np.ones(len(recipe_ids), dtype=bool)
+        keys = get_band_keys(signatures).T
+        self.band_order = np.argsort(keys, axis=1, kind='stable')
+        self.band_keys = np.take_along_axis(keys, self.band_order, axis=1)
+        self.pending = {}
+
+    @classmethod
+    def build(cls):
+        # Номер берётся до чтения базы: изменения, записанные во время
+        # сборки, применятся повторно, это безопасно.
+        change_number = get_change_number()
+        recipe_ids, signatures = compute_signatures(load_rows())
+        return cls(recipe_ids, signatures, change_number)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            change_number = (int(data['change_number'])
+                             if 'change_number' in data.files else None)
+            return cls(data['recipe_ids'], data['signatures'],
+                       change_number)
+
+    def save(self, path):
+        recipe_ids, signatures = self.get_arrays()
+        # Запись во временный файл и замена: процессы не прочтут
+        # недописанный индекс.
+        temporary_path = f'{path}.tmp'
+        with open(temporary_path, 'wb') as file:
+            np.savez(file, recipe_ids=recipe_ids, signatures=signatures,
+                     change_number=np.int64(self.change_number))
+        os.replace(temporary_path, path)
+
+    def get_arrays(self):
+        """Актуальные id и подписи с учётом pending."""
+        recipe_ids = self.recipe_ids[self.alive]
+        signatures = self.signatures[self.alive]
+        pending = {pk: signature for pk, signature in self.pending.items()
+                   if signature is not None}
+        if pending:
+            recipe_ids = np.concatenate(
+                (recipe_ids, np.fromiter(pending, dtype=np.int64)))
+            signatures = np.concatenate(
+                (signatures, np.stack(list(pending.values()))))
+            order = np.argsort(recipe_ids, kind='stable')
+            recipe_ids, signatures = recipe_ids[order], signatures[order]
+        return recipe_ids, signatures
+
+    def find_position(self, recipe_id):
+        position = int(np.searchsorted(self.recipe_ids, recipe_id))
+        if (position < len(self.recipe_ids)
+                and self.recipe_ids[position] == recipe_id
+                and self.alive[position]):
+            return position
+        return None
+
+    def get_signature(self, recipe_id):
+        if recipe_id in self.pending:
+            return self.pending[recipe_id]
+        position = self.find_position(recipe_id)
+        if position is None:
+            return None
+        return self.signatures[position]
+
+    def refresh(self, change_number):
+        """
+        Пересчитывает подписи рецептов из записей журнала после
+        self.change_number и убирает удалённые. Если записей слишком
+        много или части нет (вытеснена из кеша или ещё не дописана),
+        индекс строится заново.
+        """
+        if (self.change_number is None
+                or not 0 < change_number - self.change_number
+                <= MAX_PENDING):
+            return SimilarIndex.build()
+        keys = [CHANGE_KEY.format(number) for number
+                in range(self.change_number + 1, change_number + 1)]
+        changes = cache.get_many(keys)
+        if len(changes) < len(keys):
+            return SimilarIndex.build()
+
+        changed = set(changes.values())
+        recipe_ids, signatures = compute_signatures(load_rows(changed))
+        for recipe_id in changed:
+            self.discard(recipe_id)
+            self.pending[recipe_id] = None
+        for recipe_id, signature in zip(recipe_ids.tolist(), signatures):
+            self.pending[recipe_id] = signature
+
+        self.change_number = change_number
+        if len(self.pending) > MAX_PENDING:
+            return SimilarIndex(*self.get_arrays(), change_number)
+        return self
+
+    def discard(self, recipe_id):
+        position = self.find_position(recipe_id)
+        if position is not None:
+            self.alive[position] = False
+
+    def get_candidates(self, signature, recipe_id):
+        keys = get_band_keys(signature[None, :])[0]
+        positions = []
+        for band, key in enumerate(keys):
+            band_keys = self.band_keys[band]
+            start = np.searchsorted(band_keys, key, side='left')
+            end = np.searchsorted(band_keys, key, side='right')
+            positions.append(self.band_order[band, start:end])
+        positions = np.unique(np.concatenate(positions))
+        positions = positions[self.alive[positions]]
+        candidate_ids = self.recipe_ids[positions]
+        candidate_signatures = self.signatures[positions]
+
+        pending = [(pk, value) for pk, value in self.pending.items()
+                   if value is not None and pk != recipe_id]
+        if pending:
+            pending_signatures = np.stack([value for _, value in pending])
+            matches = (get_band_keys(pending_signatures) == keys).any(axis=1)
+            if matches.any():
+                candidate_ids = np.concatenate((
+                    candidate_ids,
+                    np.array([pk for pk, _ in pending])[matches]))
+                candidate_signatures = np.concatenate(
+                    (candidate_signatures, pending_signatures[matches]))
+        keep = candidate_ids != recipe_id
+        return candidate_ids[keep], candidate_signatures[keep]
+
+    def search(self, recipe_id, limit):
+        """
+        Возвращает до limit пар (id рецепта, оценка сходства Жаккара)
+        по убыванию сходства.
+        """
+        signature = self.get_signature(recipe_id)
+        if signature is None:
+            return []
+        candidate_ids, candidate_signatures = self.get_candidates(
+            signature, recipe_id)
+        if not len(candidate_ids):
+            return []
+        similarity = (candidate_signatures == signature).mean(axis=1)
+        order = np.lexsort((-candidate_ids, -similarity))[:limit]
+        return list(zip(candidate_ids[order].tolist(),
+                        similarity[order].tolist()))
+
+
+def get_similar_index():
+    """
+    Индекс текущего процесса. Загружается из файла, собранного командой
+    build_similar_index, или строится из базы. Рецепты из новых записей
+    журнала изменений пересчитываются на месте.
+    """
+    global _similar_index
+    if _similar_index is None:
+        path = settings.SIMILAR_INDEX_PATH
+        if os.path.exists(path):
+            _similar_index = SimilarIndex.load(path)
+        else:
+            _similar_index = SimilarIndex.build()
+    change_number = get_change_number()
+    if _similar_index.change_number != change_number:
+        _similar_index = _similar_index.refresh(change_number)
+    return _similar_index
@@ -0,0 +1,72 @@
+from django.http import HttpResponse
+from rest_framework.renderers import JSONRenderer
+
+from .cache import get_versions
+
+_snapshots = {}
+
+
+class ReferenceSnapshot:
+    """
+    Снимок справочника: готовые JSON-байты списка и каждого объекта
+    и сериализованные объекты по id для встраивания в другие ответы.
+    """
+
+    def __init__(self, queryset, serializer_class, version=None):
+        self.version = version
+        renderer = JSONRenderer()
+        data = serializer_class(queryset, many=True).data
+        self.data_by_id = {item['id']: item for item in data}
+        self.list_content = renderer.render(data)
+        self.detail_content = {pk: renderer.render(item)
+                               for pk, item in self.data_by_id.items()}
+        self.ids_by = {}
+
+    def get_ids_by(self, field):
+        """Словарь {значение поля: id}, собирается один раз на снимок."""
+        if field not in self.ids_by:
+            self.ids_by[field] = {item[field]: pk
+                                  for pk, item in self.data_by_id.items()}
+        return self.ids_by[field]
+
+
+def get_snapshot(model, serializer_class):
+    """
+    Возвращает снимок текущего процесса и пересобирает его,
+    если версия модели в кеше изменилась.
+    """
+    key = (model, serializer_class)
+    version = get_versions((model,))[0]
+    snapshot = _snapshots.get(key)
+    if snapshot is None or snapshot.version != version:
+        snapshot = ReferenceSnapshot(model.objects.all(), serializer_class,
+                                     version)
+        _snapshots[key] = snapshot
+    return snapshot
+
+
+class SnapshotMixin:
+    """
+    Отдаёт list/retrieve справочника готовыми байтами из снимка,
+    не обращаясь к базе. Другие форматы идут обычным путём.
+    """
+
+    def get_snapshot(self):
+        return get_snapshot(self.queryset.model, self.get_serializer_class())
+
+    def list(self, request, *args, **kwargs):
+        if request.accepted_renderer.format != 'json':
+            return super().list(request, *args, **kwargs)
+        return HttpResponse(self.get_snapshot().list_content,
+                            content_type='application/json')
+
+    def retrieve(self, request, *args, **kwargs):
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        try:
+            pk = int(self.kwargs[lookup_url_kwarg])
+        except ValueError:
+            pk = None
+        content = self.get_snapshot().detail_content.get(pk)
+        if content is None or request.accepted_renderer.format != 'json':
+            return super().retrieve(request, *args, **kwargs)
+        return HttpResponse(content, content_type='application/json')
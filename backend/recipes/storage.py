@@ -0,0 +1,63 @@
+import hashlib
+import os
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+from PIL import Image
+
+# Расширение берётся по формату, который определил Pillow, а не из имени
+# от клиента: одинаковые байты под .jpg и .jpeg получают одно имя.
+FORMAT_EXTENSIONS = {
+    'JPEG': '.jpg',
+    'PNG': '.png',
+    'GIF': '.gif',
+    'WEBP': '.webp',
+    'BMP': '.bmp',
+    'TIFF': '.tif',
+}
+
+
+def get_content_hash(content):
+    digest = hashlib.sha256()
+    content.seek(0)
+    for chunk in content.chunks():
+        digest.update(chunk)
+    content.seek(0)
+    return digest.hexdigest()
+
+
+def get_content_extension(content, default):
+    content.seek(0)
+    try:
+        image_format = Image.open(content).format
+    except OSError:
+        return default
+    finally:
+        content.seek(0)
+    return FORMAT_EXTENSIONS.get(image_format, default)
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    Хранит файл под именем из хеша содержимого: одинаковые картинки
+    лежат на диске один раз, повторная запись пропускается.
+    """
+
+    def get_content_name(self, name, content):
+        directory, filename = os.path.split(name)
+        extension = get_content_extension(
+            content, os.path.splitext(filename)[1].lower())
+        digest = get_content_hash(content)
+        return os.path.join(directory, digest[:2], digest + extension)
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        name = self.get_content_name(name, content)
+        if self.exists(name):
+            return name
+        return super().save(name, content, max_length=max_length)
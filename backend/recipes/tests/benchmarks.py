@@ -0,0 +1,27 @@
+import os
+import statistics
+import time
+
+import pytest
+
+# Замеры долгие и пишут в базу сотни тысяч строк, поэтому запускаются
+# только явно: BENCHMARK=1 pytest -s recipes/tests -k benchmark
+benchmark = pytest.mark.skipif(
+    not os.getenv('BENCHMARK'),
+    reason='замеры запускаются с переменной окружения BENCHMARK=1')
+
+
+def measure(func, *args, repeat=100):
+    """Медианное время одного вызова в миллисекундах."""
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func(*args)
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
+
+
+def report(title, rows):
+    print(f'\n{title}')
+    for name, value in rows:
+        print(f'  {name:<50} {value:10.3f}')
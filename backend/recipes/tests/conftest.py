@@ -0,0 +1,74 @@
+import pytest
+from django.core.cache import cache
+from rest_framework.test import APIClient
+
+from recipes.models import Ingredient, IngredientInRecipe, Recipe, Tag
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    cache.clear()
+
+
+@pytest.fixture
+def user(django_user_model):
+    return django_user_model.objects.create_user(
+        email='user@foodgram.ru', username='user', first_name='Имя',
+        last_name='Фамилия', password='password12345')
+
+
+@pytest.fixture
+def author(django_user_model):
+    return django_user_model.objects.create_user(
+        email='author@foodgram.ru', username='author', first_name='Имя',
+        last_name='Фамилия', password='password12345')
+
+
+@pytest.fixture
+def anonymous_client():
+    return APIClient()
+
+
+@pytest.fixture
+def user_client(user):
+    client = APIClient()
+    client.force_authenticate(user)
+    return client
+
+
+@pytest.fixture
+def media_root(settings, tmp_path):
+    settings.MEDIA_ROOT = str(tmp_path)
+    return tmp_path
+
+
+@pytest.fixture
+def tags(db):
+    return [Tag.objects.create(name=f'Тег {index}', color='#FFFFFF',
+                               slug=f'tag{index}')
+            for index in range(3)]
+
+
+@pytest.fixture
+def ingredients(db):
+    return [Ingredient.objects.create(name=name, measurement_unit='г')
+            for name in ('мёд', 'мука', 'молоко', 'сахар', 'соль', 'яйца')]
+
+
+def create_recipe(author, tags, ingredients, number=0, cooking_time=10,
+                  name=None, text='Описание'):
+    recipe = Recipe.objects.create(author=author,
+                                   name=name or f'Рецепт {number}',
+                                   text=text, cooking_time=cooking_time)
+    recipe.tags.set(tags)
+    IngredientInRecipe.objects.bulk_create(
+        IngredientInRecipe(recipe=recipe, ingredient=ingredient,
+                           amount=index + 1)
+        for index, ingredient in enumerate(ingredients))
+    return recipe
+
+
+@pytest.fixture
+def recipes(author, tags, ingredients):
+    return [create_recipe(author, tags[:2], ingredients[:3], number)
+            for number in range(15)]
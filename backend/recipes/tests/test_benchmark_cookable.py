@@ -0,0 +1,82 @@
+import random
+
+import pytest
+from django.contrib.auth import get_user_model
+from django.db.models import Count, Q
+
+from recipes.models import Ingredient, IngredientInRecipe, Recipe
+from recipes.search import CookableIndex
+from .benchmarks import benchmark, measure, report
+
+User = get_user_model()
+
+RECIPES_COUNT = 100000
+INGREDIENTS_COUNT = 2200
+QUERY_SIZES = (5, 20, 50)
+
+pytestmark = pytest.mark.django_db
+
+
+def naive_search(ingredient_ids):
+    """Прежний способ: JOIN IngredientInRecipe для каждого рецепта."""
+    return list(
+        Recipe.objects.order_by()
+        .annotate(matched=Count('ingredientinrecipe', filter=Q(
+                      ingredientinrecipe__ingredient_id__in=ingredient_ids)),
+                  total=Count('ingredientinrecipe'))
+        .filter(matched__gt=0)
+        .values_list('id', 'matched', 'total'))
+
+
+def create_recipes(generator):
+    author = User.objects.create(email='author@foodgram.ru',
+                                 username='author', password='!')
+    Ingredient.objects.bulk_create(
+        (Ingredient(name=f'Ингредиент {number}', measurement_unit='г')
+         for number in range(INGREDIENTS_COUNT)),
+        batch_size=5000)
+    ingredient_ids = list(Ingredient.objects.values_list('id', flat=True))
+    Recipe.objects.bulk_create(
+        (Recipe(author=author, name='Рецепт', text='Описание',
+                cooking_time=10) for _ in range(RECIPES_COUNT)),
+        batch_size=5000)
+    IngredientInRecipe.objects.bulk_create(
+        (IngredientInRecipe(recipe_id=recipe_id, ingredient_id=ingredient_id,
+                            amount=1)
+         for recipe_id in Recipe.objects.values_list('id', flat=True)
+         for ingredient_id in generator.sample(ingredient_ids,
+                                               generator.randint(3, 12))),
+        batch_size=5000)
+    return ingredient_ids
+
+
+@benchmark
+def test_benchmark_cookable_search():
+    generator = random.Random(0)
+    ingredient_ids = create_recipes(generator)
+    index = CookableIndex(IngredientInRecipe.objects.order_by()
+                          .values_list('ingredient_id', 'recipe_id')
+                          .iterator())
+    timings = []
+    for size in QUERY_SIZES:
+        query = generator.sample(ingredient_ids, size)
+        expected = {recipe_id: matched / total
+                    for recipe_id, matched, total in naive_search(query)}
+        assert dict(index.search(query)) == expected
+        timings.append((f'JOIN по рецептам, {size} ингредиентов',
+                        measure(naive_search, query, repeat=5)))
+        timings.append((f'Индекс, {size} ингредиентов',
+                        measure(index.search, query)))
+    recipe_id = next(iter(index.counts))
+    update = generator.sample(ingredient_ids, 10)
+
+    def update_recipe():
+        index.remove_recipe(recipe_id)
+        index.add_recipe(recipe_id, update)
+
+    timings.append(('Обновление рецепта в индексе', measure(update_recipe)))
+    report(f'Поиск по ингредиентам, {RECIPES_COUNT} рецептов, '
+           f'{INGREDIENTS_COUNT} ингредиентов, мс', timings)
+    searches = timings[:-1]
+    assert all(indexed < naive for (_, naive), (_, indexed)
+               in zip(searches[::2], searches[1::2]))
@@ -0,0 +1,91 @@
+import time
+
+import pytest
+from django.contrib.auth import get_user_model
+
+from recipes.feed import (backfill_feed, fan_out_in_batches,
+                          insert_follower_entries)
+from recipes.models import FeedEntry, Recipe
+from users.models import Follow
+from .benchmarks import benchmark, measure, report
+
+User = get_user_model()
+
+FOLLOWERS_COUNT = 10000
+# Авторы, на которых подписан читатель, и число рецептов у каждого.
+READ_AUTHORS_COUNT = 200
+RECIPES_PER_AUTHOR = 50
+WRITES = 5
+PAGE_SIZE = 10
+
+pytestmark = pytest.mark.django_db
+
+
+def create_users(prefix, count):
+    User.objects.bulk_create(
+        User(email=f'{prefix}{number}@foodgram.ru',
+             username=f'{prefix}{number}', first_name='Имя',
+             last_name='Фамилия', password='!')
+        for number in range(count))
+    return list(User.objects.filter(username__startswith=prefix)
+                .values_list('pk', flat=True))
+
+
+def create_recipes(author_ids, count):
+    Recipe.objects.bulk_create(
+        Recipe(author_id=author_id, name='Рецепт', text='Описание',
+               cooking_time=10)
+        for author_id in author_ids for _ in range(count))
+    return list(Recipe.objects.filter(author__in=author_ids))
+
+
+def read_timeline(user):
+    return list(FeedEntry.objects.filter(user=user)
+                .order_by('-pub_date', '-recipe_id')
+                .values_list('recipe_id', flat=True)[:PAGE_SIZE])
+
+
+def read_with_join(user):
+    return list(Recipe.objects.filter(author__following__user=user)
+                .order_by('-pub_date', '-id')
+                .values_list('id', flat=True)[:PAGE_SIZE])
+
+
+@benchmark
+def test_benchmark_fan_out_on_write_against_read():
+    author = User.objects.create(email='author@foodgram.ru',
+                                 username='author', password='!')
+    follower_ids = create_users('follower', FOLLOWERS_COUNT)
+    Follow.objects.bulk_create(
+        Follow(user_id=pk, following=author) for pk in follower_ids)
+    User.objects.filter(pk=author.pk).update(
+        followers_count=FOLLOWERS_COUNT)
+    author.refresh_from_db()
+
+    reader = User.objects.get(pk=follower_ids[0])
+    read_author_ids = create_users('reader_author', READ_AUTHORS_COUNT)
+    create_recipes(read_author_ids, RECIPES_PER_AUTHOR)
+    Follow.objects.bulk_create(
+        Follow(user=reader, following_id=pk) for pk in read_author_ids)
+    backfill_feed(reader.pk, read_author_ids)
+
+    writes = {fan_out_in_batches: [], insert_follower_entries: []}
+    for fan_out, timings in writes.items():
+        for recipe in create_recipes([author.pk], WRITES):
+            started = time.perf_counter()
+            fan_out(recipe.pk, recipe.pub_date, author.pk)
+            timings.append((time.perf_counter() - started) * 1000)
+    assert FeedEntry.objects.filter(
+        recipe__author=author).count() == FOLLOWERS_COUNT * WRITES * 2
+
+    assert read_timeline(reader) == read_with_join(reader)
+    report(
+        f'Лента: {FOLLOWERS_COUNT} подписчиков автора, читатель подписан '
+        f'на {READ_AUTHORS_COUNT} авторов по {RECIPES_PER_AUTHOR} '
+        f'рецептов, мс',
+        [('запись: пачками после коммита',
+          sum(writes[fan_out_in_batches]) / WRITES),
+         ('запись: одним запросом',
+          sum(writes[insert_follower_entries]) / WRITES),
+         ('чтение: страница из FeedEntry', measure(read_timeline, reader)),
+         ('чтение: JOIN по Follow', measure(read_with_join, reader))])
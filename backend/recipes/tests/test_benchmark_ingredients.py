@@ -0,0 +1,32 @@
+import json
+import os
+
+from django.conf import settings
+
+from recipes.search import MAX_INGREDIENT_RESULTS, IngredientIndex
+from .benchmarks import benchmark, measure, report
+
+NAMES_COUNT = 100000
+QUERIES = ('м', 'мо', 'мол', 'молоко', 'ко', 'сахар', 'пудра', 'ое',
+           'варенье', 'щщщ')
+
+
+def get_names():
+    """Названия из data/ingredients.json, размноженные до NAMES_COUNT."""
+    path = os.path.join(os.path.dirname(settings.BASE_DIR), 'data',
+                        'ingredients.json')
+    with open(path, encoding='utf-8') as file:
+        names = [row['name'] for row in json.load(file)]
+    return [f'{names[number % len(names)]} {number // len(names)}'
+            for number in range(NAMES_COUNT)]
+
+
+@benchmark
+def test_benchmark_ingredient_search():
+    index = IngredientIndex(
+        (pk, name, 'г') for pk, name in enumerate(get_names()))
+    timings = [(query, measure(index.search, query)) for query in QUERIES]
+    report(f'Поиск ингредиентов, {NAMES_COUNT} названий, мс', timings)
+    assert all(len(index.search(query)) <= MAX_INGREDIENT_RESULTS
+               for query in QUERIES)
+    assert max(timing for _, timing in timings) < 1
@@ -0,0 +1,105 @@
+import random
+import statistics
+import time
+
+import numpy as np
+
+from recipes.similar import SimilarIndex, compute_signatures
+from .benchmarks import benchmark, measure, report
+
+RECIPES_COUNT = 100000
+INGREDIENTS_COUNT = 2200
+GROUP_SIZE = 10
+LIMIT = 10
+QUERIES_COUNT = 200
+# Доля найденных соседей считается среди точных top-LIMIT с таким
+# сходством: ниже порога LSH по лентам (около 0.42) соседи и не ищутся.
+MIN_SIMILARITY = 0.5
+
+
+def create_rows(generator):
+    """
+    Строки (recipe_id, ingredient_id): рецепты группами по GROUP_SIZE
+    вокруг общего набора, в каждом заменены один-два ингредиента.
+    """
+    rows = []
+    ingredient_ids = range(INGREDIENTS_COUNT)
+    for recipe_id in range(RECIPES_COUNT):
+        if recipe_id % GROUP_SIZE == 0:
+            base = generator.sample(ingredient_ids, generator.randint(6, 12))
+        ingredients = set(base)
+        for _ in range(generator.randint(1, 2)):
+            ingredients.discard(generator.choice(base))
+            ingredients.add(generator.randrange(INGREDIENTS_COUNT))
+        rows.extend((recipe_id, ingredient_id)
+                    for ingredient_id in sorted(ingredients))
+    return np.array(rows, dtype=np.int64)
+
+
+class ExactSearch:
+    """Точный перебор: сходство Жаккара со всеми рецептами сразу."""
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.sizes = np.bincount(rows[:, 0], minlength=RECIPES_COUNT)
+        order = np.argsort(rows[:, 1], kind='stable')
+        self.postings = rows[order, 0]
+        self.bounds = np.searchsorted(rows[order, 1],
+                                      np.arange(INGREDIENTS_COUNT + 1))
+
+    def get_similarity(self, recipe_id):
+        ingredients = self.rows[self.rows[:, 0] == recipe_id, 1]
+        common = np.bincount(
+            np.concatenate([
+                self.postings[self.bounds[ingredient]:
+                              self.bounds[ingredient + 1]]
+                for ingredient in ingredients]),
+            minlength=RECIPES_COUNT)
+        similarity = common / (len(ingredients) + self.sizes - common)
+        similarity[recipe_id] = -1
+        return similarity
+
+    def search(self, recipe_id, limit):
+        similarity = self.get_similarity(recipe_id)
+        order = np.argsort(-similarity, kind='stable')[:limit]
+        return list(zip(order.tolist(), similarity[order].tolist()))
+
+
+@benchmark
+def test_benchmark_similar_search():
+    generator = random.Random(0)
+    rows = create_rows(generator)
+    started = time.perf_counter()
+    index = SimilarIndex(*compute_signatures(rows))
+    build_time = (time.perf_counter() - started) * 1000
+    exact = ExactSearch(rows)
+    queries = generator.sample(range(RECIPES_COUNT), QUERIES_COUNT)
+
+    found = relevant = 0
+    for recipe_id in queries:
+        similarity = exact.get_similarity(recipe_id)
+        neighbours = {pk for pk, value in exact.search(recipe_id, LIMIT)
+                      if value >= MIN_SIMILARITY}
+        approximate = {pk for pk, _ in index.search(recipe_id, LIMIT)}
+        relevant += len(neighbours)
+        found += len(neighbours & approximate)
+        # Оценки MinHash близки к точному сходству.
+        assert all(abs(value - similarity[pk]) < 0.25
+                   for pk, value in index.search(recipe_id, LIMIT))
+    recall = found / relevant
+
+    timings = [
+        ('Построение индекса', build_time),
+        ('Точный перебор', statistics.median(
+            measure(exact.search, pk, LIMIT, repeat=5)
+            for pk in queries[:20])),
+        ('MinHash + LSH', statistics.median(
+            measure(index.search, pk, LIMIT, repeat=20)
+            for pk in queries[:20])),
+        (f'Полнота top-{LIMIT} при сходстве >= {MIN_SIMILARITY}, доля',
+         recall),
+    ]
+    report(f'Похожие рецепты, {RECIPES_COUNT} рецептов, мс', timings)
+    assert timings[2][1] < 10
+    assert timings[2][1] < timings[1][1]
+    assert recall > 0.9
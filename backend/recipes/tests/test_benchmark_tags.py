@@ -0,0 +1,82 @@
+import random
+from types import SimpleNamespace
+
+import django_filters
+import pytest
+from django.contrib.auth import get_user_model
+from django.http import QueryDict
+
+from recipes.filters import RecipeFilter
+from recipes.models import Recipe, Tag
+from .benchmarks import benchmark, measure, report
+
+User = get_user_model()
+
+RECIPES_COUNT = 100000
+TAGS_COUNT = 10
+PAGE_SIZE = 10
+QUERIES = ('tags=tag0', 'tags=tag0&tags=tag1&tags=tag2',
+           'tags=tag0&tags=tag1&all_tags=1')
+
+pytestmark = pytest.mark.django_db
+
+
+class PreviousRecipeFilter(django_filters.FilterSet):
+    """Прежний фильтр для сравнения: JOIN по тегам и DISTINCT."""
+    tags = django_filters.ModelMultipleChoiceFilter(
+        field_name='tags__slug', queryset=Tag.objects.all(),
+        to_field_name='slug')
+
+    class Meta:
+        model = Recipe
+        fields = ('tags',)
+
+
+def filter_page(filterset_class, query):
+    queryset = filterset_class(
+        QueryDict(query), queryset=Recipe.objects.all(),
+        request=SimpleNamespace(user=None)).qs
+    count = queryset.count()
+    page = list(queryset.order_by('-pub_date', '-id')
+                .values_list('id', flat=True)[:PAGE_SIZE])
+    return count, page, queryset.order_by('-pub_date', '-id')[:PAGE_SIZE]
+
+
+def create_recipes():
+    author = User.objects.create(email='author@foodgram.ru',
+                                 username='author', password='!')
+    Tag.objects.bulk_create(
+        Tag(name=f'Тег {number}', color='#FFFFFF', slug=f'tag{number}')
+        for number in range(TAGS_COUNT))
+    tag_ids = list(Tag.objects.values_list('id', flat=True))
+    Recipe.objects.bulk_create(
+        (Recipe(author=author, name='Рецепт', text='Описание',
+                cooking_time=10) for _ in range(RECIPES_COUNT)),
+        batch_size=5000)
+    through = Recipe.tags.through
+    generator = random.Random(0)
+    through.objects.bulk_create(
+        (through(recipe_id=recipe_id, tag_id=tag_id)
+         for recipe_id in Recipe.objects.values_list('id', flat=True)
+         for tag_id in generator.sample(tag_ids, generator.randint(1, 3))),
+        batch_size=5000)
+
+
+@benchmark
+def test_benchmark_tag_filter_plans():
+    create_recipes()
+    rows = []
+    for query in QUERIES:
+        new_count, new_page, new_queryset = filter_page(RecipeFilter, query)
+        if 'all_tags' not in query:
+            old_count, old_page, old_queryset = filter_page(
+                PreviousRecipeFilter, query)
+            assert (old_count, old_page) == (new_count, new_page)
+            rows.append((f'JOIN + DISTINCT: {query}', measure(
+                filter_page, PreviousRecipeFilter, query, repeat=10)))
+            print(f'\n{query}, JOIN + DISTINCT:\n{old_queryset.explain()}')
+        rows.append((f'EXISTS: {query}', measure(
+            filter_page, RecipeFilter, query, repeat=10)))
+        print(f'\n{query}, EXISTS:\n{new_queryset.explain()}')
+    report(f'Фильтр по тегам, {RECIPES_COUNT} рецептов и {TAGS_COUNT} '
+           f'тегов: COUNT и первая страница, мс', rows)
@@ -0,0 +1,114 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.error import HTTPError
+from urllib.request import Request, urlopen
+
+import pytest
+from django.db import connections
+from django.shortcuts import get_object_or_404
+from django.urls import include, path
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from recipes.models import Favorite, Recipe
+from recipes.serializers import FavoriteRecipeSerializer
+from .benchmarks import benchmark, report
+from .conftest import create_recipe
+
+USERS_COUNT = 8
+RECIPES_COUNT = 20
+# Каждый пользователь добавляет и убирает каждый рецепт по кругу.
+ROUNDS = 3
+
+
+class PreviousFavoriteView(APIView):
+    """
+    Прежний порядок запросов для сравнения: поиск рецепта, проверка
+    дубликата и вставка; при удалении поиск рецепта, строки и DELETE.
+    """
+
+    def post(self, request, recipe_id):
+        recipe = get_object_or_404(Recipe, id=recipe_id)
+        if Favorite.objects.filter(user=request.user,
+                                   favorite=recipe).exists():
+            return Response(status=status.HTTP_400_BAD_REQUEST)
+        Favorite.objects.create(user=request.user, favorite=recipe)
+        return Response(FavoriteRecipeSerializer(recipe).data,
+                        status=status.HTTP_201_CREATED)
+
+    def delete(self, request, recipe_id):
+        recipe = get_object_or_404(Recipe, id=recipe_id)
+        get_object_or_404(Favorite, user=request.user,
+                          favorite=recipe).delete()
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+urlpatterns = [
+    path('previous/<int:recipe_id>/favorite/',
+         PreviousFavoriteView.as_view()),
+    path('', include('foodgram.urls')),
+]
+
+
+def send(method, url, token):
+    request = Request(url, method=method,
+                      headers={'Authorization': f'Token {token}'})
+    try:
+        with urlopen(request) as response:
+            return response.status
+    except HTTPError as error:
+        return error.code
+
+
+def toggle_all(base_url, token, recipe_ids):
+    statuses = []
+    for _ in range(ROUNDS):
+        for recipe_id in recipe_ids:
+            url = base_url.format(recipe_id)
+            statuses.append(send('POST', url, token))
+            statuses.append(send('DELETE', url, token))
+    # Потоки сервера держат свои соединения, поток клиента - нет.
+    connections.close_all()
+    return statuses
+
+
+def run_load(base_url, tokens, recipe_ids):
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=len(tokens)) as executor:
+        results = list(executor.map(
+            lambda token: toggle_all(base_url, token, recipe_ids), tokens))
+    elapsed = time.perf_counter() - started
+    statuses = [code for codes in results for code in codes]
+    return len(statuses) / elapsed, statuses
+
+
+@benchmark
+@pytest.mark.urls(__name__)
+def test_benchmark_concurrent_toggles(live_server, django_user_model,
+                                      tags, ingredients):
+    author = django_user_model.objects.create_user(
+        email='author@foodgram.ru', username='author',
+        first_name='Имя', last_name='Фамилия', password='password12345')
+    recipe_ids = [create_recipe(author, tags[:1], ingredients[:3], number).pk
+                  for number in range(RECIPES_COUNT)]
+    tokens = []
+    for number in range(USERS_COUNT):
+        user = django_user_model.objects.create_user(
+            email=f'user{number}@foodgram.ru', username=f'user{number}',
+            first_name='Имя', last_name='Фамилия', password='password12345')
+        tokens.append(Token.objects.create(user=user).key)
+
+    rows = []
+    for name, base_url in (
+            ('прежние запросы', f'{live_server.url}/previous/{{}}/favorite/'),
+            ('один запрос', f'{live_server.url}/api/recipes/{{}}/favorite/')):
+        requests_per_second, statuses = run_load(base_url, tokens,
+                                                 recipe_ids)
+        assert set(statuses) == {201, 204}
+        assert not Favorite.objects.exists()
+        assert not Recipe.objects.filter(favorites_count__gt=0).exists()
+        rows.append((name, requests_per_second))
+    report(f'Добавление и удаление избранного, {USERS_COUNT} потоков, '
+           f'запросов в секунду', rows)
@@ -0,0 +1,93 @@
+import base64
+import json
+import os
+import statistics
+import time
+import tracemalloc
+from io import BytesIO
+
+import pytest
+from django.test.client import BOUNDARY, MULTIPART_CONTENT, encode_multipart
+from PIL import Image
+from rest_framework.test import APIClient
+
+from .benchmarks import benchmark, report
+
+# Шум почти не сжимается: PNG выходит около 5 МБ, в пределах MAX_IMAGE_SIZE.
+IMAGE_SIDE = 1290
+REPEAT = 5
+
+pytestmark = pytest.mark.django_db
+
+
+def get_noise_png():
+    buffer = BytesIO()
+    Image.frombytes('RGB', (IMAGE_SIDE, IMAGE_SIDE),
+                    os.urandom(IMAGE_SIDE * IMAGE_SIDE * 3)).save(
+        buffer, 'PNG', compress_level=1)
+    return buffer.getvalue()
+
+
+def get_fields(tags, ingredients):
+    return {'name': 'Рецепт', 'text': 'Описание', 'cooking_time': 10,
+            'tags': [tags[0].pk],
+            'ingredients': [{'id': ingredients[0].pk, 'amount': 2}]}
+
+
+def get_multipart_body(fields, content):
+    data = {**fields, 'tags': json.dumps(fields['tags']),
+            'ingredients': json.dumps(fields['ingredients']),
+            'image': BytesIO(content)}
+    data['image'].name = 'photo.png'
+    return encode_multipart(BOUNDARY, data), MULTIPART_CONTENT
+
+
+def get_json_body(fields, content):
+    image = 'data:image/png;base64,' + base64.b64encode(content).decode()
+    return json.dumps({**fields, 'image': image}).encode(), 'application/json'
+
+
+def post(client, body, content_type):
+    response = client.post('/api/recipes/', body, content_type=content_type)
+    assert response.status_code == 201, response.content[:200]
+
+
+def run(client, bodies):
+    """
+    Медианное время запроса в мс и пик памяти последнего запроса в МБ.
+    В пик входит и копия тела, которую держит тестовый клиент.
+    """
+    timings = []
+    for body, content_type in bodies[:-1]:
+        started = time.perf_counter()
+        post(client, body, content_type)
+        timings.append((time.perf_counter() - started) * 1000)
+    tracemalloc.start()
+    try:
+        post(client, *bodies[-1])
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return statistics.median(timings), peak / (1024 * 1024)
+
+
+@benchmark
+def test_benchmark_image_upload(author, tags, ingredients, media_root):
+    client = APIClient()
+    client.force_authenticate(author)
+    fields = get_fields(tags, ingredients)
+    # Каждый запрос со своей картинкой: одинаковые файлы хранилище
+    # не записывает повторно. Тела собираются до замеров.
+    results = {}
+    for name, get_body in (('multipart', get_multipart_body),
+                           ('JSON + base64', get_json_body)):
+        bodies = [get_body(fields, get_noise_png())
+                  for _ in range(REPEAT + 1)]
+        results[name] = (*run(client, bodies),
+                         len(bodies[0][0]) / (1024 * 1024))
+    report('Загрузка картинки около 5 МБ', [
+        row for name, (latency, peak, size) in results.items()
+        for row in ((f'{name}: тело запроса, МБ', size),
+                    (f'{name}: время запроса, мс', latency),
+                    (f'{name}: пик памяти, МБ', peak))])
+    assert results['multipart'][1] < results['JSON + base64'][1]
@@ -0,0 +1,60 @@
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from recipes.models import Recipe, ShoppingCart, ShoppingListItem
+from recipes.shopping_list import compute_shopping_list_totals
+
+URL = '/api/recipes/shopping_cart/bulk/'
+MISSING_ID = 10 ** 9
+
+pytestmark = pytest.mark.django_db
+
+
+def get_shopping_lists():
+    return {(item.user_id, item.ingredient_id): item.total_amount
+            for item in ShoppingListItem.objects.all()}
+
+
+def test_bulk_add_reports_each_id(user, user_client, recipes):
+    ShoppingCart.objects.create(user=user, recipe=recipes[0])
+    ids = [recipes[0].pk, recipes[1].pk, MISSING_ID, recipes[1].pk]
+    response = user_client.post(URL, {'recipes': ids}, format='json')
+    assert response.status_code == 200
+    assert response.data['results'] == [
+        {'id': recipes[0].pk, 'status': 'exists'},
+        {'id': recipes[1].pk, 'status': 'created'},
+        {'id': MISSING_ID, 'status': 'not_found'},
+    ]
+    assert Recipe.objects.get(pk=recipes[0].pk).in_carts_count == 1
+    assert Recipe.objects.get(pk=recipes[1].pk).in_carts_count == 1
+    assert get_shopping_lists() == compute_shopping_list_totals()
+
+
+def test_bulk_add_skips_rows_inserted_concurrently(user, user_client,
+                                                   recipes):
+    # Строка, вставленная другим запросом со своими побочными эффектами,
+    # не должна второй раз попасть в счётчик и список покупок.
+    ShoppingCart.objects.create(user=user, recipe=recipes[0])
+    response = user_client.post(URL, {'recipes': [recipes[0].pk]},
+                                format='json')
+    assert response.data['results'][0]['status'] == 'exists'
+    assert Recipe.objects.get(pk=recipes[0].pk).in_carts_count == 1
+    assert get_shopping_lists() == compute_shopping_list_totals()
+
+
+def test_bulk_delete_runs_constant_queries(user, user_client, recipes):
+    query_counts = []
+    for recipes_count in (1, 10):
+        ids = [recipe.pk for recipe in recipes[:recipes_count]]
+        user_client.post(URL, {'recipes': ids}, format='json')
+        with CaptureQueriesContext(connection) as context:
+            response = user_client.delete(URL, {'recipes': ids + [MISSING_ID]},
+                                          format='json')
+        query_counts.append(len(context.captured_queries))
+        assert [result['status'] for result in response.data['results']] \
+            == ['deleted'] * recipes_count + ['not_found']
+    assert query_counts[0] == query_counts[1]
+    assert not ShoppingCart.objects.exists()
+    assert not ShoppingListItem.objects.exists()
+    assert not Recipe.objects.filter(in_carts_count__gt=0).exists()
@@ -0,0 +1,66 @@
+import pytest
+from django.core.cache import cache
+from django.db import transaction
+
+from recipes import cache as versions_cache, search
+from recipes.cache import (VERSION_KEY, bump_version, get_own_bumps,
+                           get_scope_key, get_versions)
+from recipes.models import IngredientInRecipe, Recipe, ShoppingCart
+from recipes.search import get_cookable_index, update_cookable_index
+from .conftest import create_recipe
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture(autouse=True)
+def reset_index(monkeypatch):
+    monkeypatch.setattr(search, '_cookable_index', None)
+
+
+def bump_from_other_process(model):
+    get_versions((model,))
+    cache.incr(VERSION_KEY.format(get_scope_key(model)))
+
+
+def test_search_ranks_by_coverage(author, tags, ingredients):
+    full = create_recipe(author, tags[:1], ingredients[:2], 1)
+    half = create_recipe(author, tags[:1], ingredients[1:3], 2)
+    index = get_cookable_index()
+    assert index.search([ingredients[0].pk, ingredients[1].pk]) == [
+        (full.pk, 1.0), (half.pk, 0.5)]
+
+
+def test_own_change_is_applied_in_place(
+        author, tags, ingredients, django_capture_on_commit_callbacks):
+    index = get_cookable_index()
+    with django_capture_on_commit_callbacks(execute=True):
+        recipe = create_recipe(author, tags[:1], ingredients[:2])
+        update_cookable_index(recipe.pk, [ingredients[0].pk,
+                                          ingredients[1].pk])
+    assert search._cookable_index is index
+    assert index.version == get_versions((Recipe, IngredientInRecipe))
+    assert get_cookable_index() is index
+    assert index.search([ingredients[0].pk]) == [(recipe.pk, 0.5)]
+
+
+def test_change_from_other_process_drops_index(
+        author, tags, ingredients, django_capture_on_commit_callbacks):
+    get_cookable_index()
+    with django_capture_on_commit_callbacks(execute=True):
+        recipe = create_recipe(author, tags[:1], ingredients[:2])
+        # Версию поднимает другой процесс между коммитом и обновлением.
+        transaction.on_commit(
+            lambda: bump_from_other_process(IngredientInRecipe))
+        update_cookable_index(recipe.pk, [ingredients[0].pk,
+                                          ingredients[1].pk])
+    assert search._cookable_index is None
+
+
+def test_only_shared_bumps_are_counted(user):
+    before = get_own_bumps((Recipe, ShoppingCart))
+    bump_version(Recipe)
+    bump_version(ShoppingCart, scope=user.pk)
+    assert get_own_bumps((Recipe, ShoppingCart)) == [before[0] + 1,
+                                                     before[1]]
+    assert get_scope_key(ShoppingCart, user.pk) not in (
+        versions_cache._local.bumps)
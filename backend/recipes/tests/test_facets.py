@@ -0,0 +1,74 @@
+import pytest
+
+from recipes.models import Favorite, ShoppingCart
+from .conftest import create_recipe
+
+pytestmark = pytest.mark.django_db
+
+URL = '/api/recipes/facets/'
+
+
+@pytest.fixture
+def facet_recipes(author, tags, ingredients):
+    return [
+        create_recipe(author, [tags[0]], ingredients[:1], 1, 10),
+        create_recipe(author, [tags[1]], ingredients[:1], 2, 20),
+        create_recipe(author, tags[:2], ingredients[:1], 3, 40),
+        create_recipe(author, [tags[2]], ingredients[:1], 4, 70),
+    ]
+
+
+def get_counts(client, query=''):
+    response = client.get(f'{URL}?{query}')
+    assert response.status_code == 200
+    data = response.json()
+    return (data['count'], [tag['count'] for tag in data['tags']],
+            [bucket['count'] for bucket in data['cooking_time']])
+
+
+def test_facets_without_filters(anonymous_client, facet_recipes):
+    assert get_counts(anonymous_client) == (4, [2, 2, 1], [1, 1, 1, 1])
+
+
+@pytest.mark.parametrize('query, count, buckets', (
+    ('tags=tag0', 2, [1, 0, 1, 0]),
+    ('tags=tag0&tags=tag2', 3, [1, 0, 1, 1]),
+    ('tags=tag0&tags=tag1&all_tags=1', 1, [0, 0, 1, 0]),
+))
+def test_tag_counts_ignore_tags_filter(anonymous_client, facet_recipes,
+                                       query, count, buckets):
+    assert get_counts(anonymous_client, query) == (count, [2, 2, 1],
+                                                   buckets)
+
+
+def test_tag_counts_keep_other_filters(user_client, user, facet_recipes):
+    assert get_counts(user_client, f'author={user.pk}&tags=tag0') == (
+        0, [0, 0, 0], [0, 0, 0, 0])
+
+
+def test_facets_single_query(anonymous_client, facet_recipes,
+                             django_assert_num_queries):
+    get_counts(anonymous_client, 'tags=tag1')
+    with django_assert_num_queries(1):
+        get_counts(anonymous_client, 'tags=tag0&tags=tag1&all_tags=1')
+
+
+def test_unknown_tag(anonymous_client, facet_recipes):
+    assert anonymous_client.get(f'{URL}?tags=missing').status_code == 400
+
+
+def test_search_with_other_filters(user_client, user, facet_recipes):
+    Favorite.objects.create(user=user, favorite=facet_recipes[0])
+    Favorite.objects.create(user=user, favorite=facet_recipes[2])
+    ShoppingCart.objects.create(user=user, recipe=facet_recipes[2])
+    ShoppingCart.objects.create(user=user, recipe=facet_recipes[3])
+    assert get_counts(user_client, 'search=рецепт') == (
+        4, [2, 2, 1], [1, 1, 1, 1])
+    assert get_counts(user_client, 'search=рецепт&tags=tag1') == (
+        2, [2, 2, 1], [0, 1, 1, 0])
+    assert get_counts(
+        user_client, 'search=рецепт&tags=tag0&is_favorited=1') == (
+        2, [2, 1, 0], [1, 0, 1, 0])
+    assert get_counts(
+        user_client, 'search=рецепт&is_favorited=1&is_in_shopping_cart=1'
+    ) == (1, [1, 1, 0], [0, 0, 1, 0])
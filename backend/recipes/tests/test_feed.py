@@ -0,0 +1,52 @@
+import pytest
+
+from recipes import feed
+from recipes.models import FeedEntry, Recipe
+from users.models import Follow
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture
+def followers(django_user_model, author):
+    users = [django_user_model.objects.create_user(
+        email=f'follower{number}@foodgram.ru', username=f'follower{number}',
+        first_name='Имя', last_name='Фамилия', password='password12345')
+        for number in range(5)]
+    for user in users:
+        Follow.objects.create(user=user, following=author)
+    author.refresh_from_db()
+    return users
+
+
+def create_recipe(author):
+    return Recipe.objects.create(author=author, name='Рецепт',
+                                 text='Описание', cooking_time=10)
+
+
+def test_small_audience_is_filled_in_transaction(author, followers):
+    recipe = create_recipe(author)
+    assert set(FeedEntry.objects.filter(recipe=recipe)
+               .values_list('user_id', flat=True)) == {
+        user.pk for user in followers}
+
+
+def test_large_audience_is_filled_in_batches_after_commit(
+        monkeypatch, author, followers, django_capture_on_commit_callbacks):
+    monkeypatch.setattr(feed, 'FANOUT_BATCH_SIZE', 2)
+    with django_capture_on_commit_callbacks() as callbacks:
+        recipe = create_recipe(author)
+    assert not FeedEntry.objects.filter(recipe=recipe).exists()
+    for callback in callbacks:
+        callback()
+    entries = FeedEntry.objects.filter(recipe=recipe)
+    assert sorted(entries.values_list('user_id', flat=True)) == sorted(
+        user.pk for user in followers)
+    assert {entry.pub_date for entry in entries} == {recipe.pub_date}
+
+
+def test_follow_backfills_and_unfollow_prunes(user, author, recipes):
+    Follow.objects.create(user=user, following=author)
+    assert user.feed.count() == len(recipes)
+    Follow.objects.filter(user=user).delete()
+    assert not user.feed.exists()
@@ -0,0 +1,46 @@
+from datetime import timedelta
+from io import BytesIO
+
+import pytest
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.utils import timezone
+from PIL import Image
+
+from recipes.models import Recipe
+
+pytestmark = [pytest.mark.django_db, pytest.mark.usefixtures('media_root')]
+
+
+def get_jpeg():
+    buffer = BytesIO()
+    Image.new('RGB', (10, 10), 'red').save(buffer, 'JPEG')
+    return buffer.getvalue()
+
+
+def test_extension_comes_from_image_format():
+    storage = Recipe._meta.get_field('image').storage
+    content = get_jpeg()
+    names = {storage.save(f'recipe_images/image{extension}',
+                          ContentFile(content))
+             for extension in ('.jpg', '.jpeg', '.JPG', '.png')}
+    assert len(names) == 1
+    assert names.pop().endswith('.jpg')
+
+
+def test_dedupe_images_changes_updated_at(author, media_root):
+    directory = media_root / 'recipe_images'
+    directory.mkdir()
+    (directory / 'old.jpeg').write_bytes(get_jpeg())
+    recipe = Recipe.objects.create(author=author, name='Рецепт',
+                                   text='Описание', cooking_time=10,
+                                   image='recipe_images/old.jpeg')
+    loaded_at = timezone.now() - timedelta(days=1)
+    Recipe.objects.filter(pk=recipe.pk).update(updated_at=loaded_at)
+
+    call_command('dedupe_images')
+
+    recipe.refresh_from_db()
+    assert recipe.image.name.endswith('.jpg')
+    assert recipe.updated_at > loaded_at
+    assert not (directory / 'old.jpeg').exists()
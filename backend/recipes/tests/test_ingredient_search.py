@@ -0,0 +1,42 @@
+import pytest
+
+from recipes.search import IngredientIndex
+
+ROWS = [(1, 'Молоко', 'мл'), (2, 'Сгущённое молоко', 'г'),
+        (3, 'Мёд', 'г'), (4, 'Масло', 'г'), (5, 'Сёмга', 'г')]
+
+
+def search_names(query, **kwargs):
+    return [row[1] for row in IngredientIndex(ROWS).search(query, **kwargs)]
+
+
+def test_prefix_matches_come_first():
+    assert search_names('мол') == ['Молоко', 'Сгущённое молоко']
+
+
+def test_search_normalizes_yo():
+    assert search_names('семга') == ['Сёмга']
+    assert search_names('сгущенное') == ['Сгущённое молоко']
+
+
+def test_single_character_matches_prefix_only():
+    assert search_names('м') == ['Масло', 'Мёд', 'Молоко']
+
+
+def test_results_are_limited():
+    assert search_names('м', limit=2) == ['Масло', 'Мёд']
+    assert search_names('о', limit=1) == []
+    assert search_names('ло', limit=1) == ['Масло']
+
+
+def test_blank_query_finds_nothing():
+    assert search_names('') == []
+    assert search_names('  ') == []
+
+
+@pytest.mark.django_db
+def test_blank_name_returns_plain_list(anonymous_client, ingredients):
+    response = anonymous_client.get('/api/ingredients/', {'name': ' '})
+    assert response.status_code == 200
+    assert response.json() == anonymous_client.get(
+        '/api/ingredients/').json()
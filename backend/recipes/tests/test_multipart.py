@@ -0,0 +1,80 @@
+import json
+from io import BytesIO
+
+import pytest
+from django.core.files.uploadedfile import SimpleUploadedFile
+from PIL import Image
+from rest_framework.test import APIClient
+
+from recipes.models import Recipe
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture
+def author_client(author):
+    client = APIClient()
+    client.force_authenticate(author)
+    return client
+
+
+def get_data(tags, ingredients):
+    return {'name': 'Рецепт', 'text': 'Описание', 'cooking_time': 10,
+            'tags': tags,
+            'ingredients': json.dumps(
+                [{'id': ingredient.pk, 'amount': 2}
+                 for ingredient in ingredients])}
+
+
+@pytest.mark.parametrize('tags_format', ('single', 'repeated', 'json'))
+def test_create_recipe_from_form(author_client, tags, ingredients,
+                                 tags_format):
+    tag_ids = {'single': [tags[0].pk],
+               'repeated': [tags[0].pk, tags[1].pk],
+               'json': [tags[0].pk, tags[1].pk]}[tags_format]
+    value = {'single': str(tag_ids[0]),
+             'repeated': [str(pk) for pk in tag_ids],
+             'json': json.dumps(tag_ids)}[tags_format]
+    response = author_client.post(
+        '/api/recipes/', get_data(value, ingredients[:2]),
+        format='multipart')
+    assert response.status_code == 201, response.data
+    recipe = Recipe.objects.get(pk=response.data['id'])
+    assert sorted(recipe.tags.values_list('pk', flat=True)) == tag_ids
+    assert recipe.ingredients.count() == 2
+
+
+def test_single_ingredient_object(author_client, tags, ingredients):
+    data = get_data(str(tags[0].pk), ())
+    data['ingredients'] = json.dumps({'id': ingredients[0].pk, 'amount': 2})
+    response = author_client.post('/api/recipes/', data, format='multipart')
+    assert response.status_code == 201, response.data
+
+
+def get_png(color):
+    buffer = BytesIO()
+    Image.new('RGB', (10, 10), color).save(buffer, 'PNG')
+    return buffer.getvalue()
+
+
+def test_image_file_is_stored(author_client, tags, ingredients, media_root):
+    content = get_png('red')
+    data = get_data(str(tags[0].pk), ingredients[:1])
+    data['image'] = SimpleUploadedFile('photo.png', content, 'image/png')
+    response = author_client.post('/api/recipes/', data, format='multipart')
+    assert response.status_code == 201, response.data
+    recipe = Recipe.objects.get(pk=response.data['id'])
+    assert recipe.image.name.startswith('recipe_images/')
+    assert recipe.image.name.endswith('.png')
+    assert (media_root / recipe.image.name).read_bytes() == content
+
+    content = get_png('blue')
+    data = get_data(str(tags[0].pk), ingredients[:1])
+    data['image'] = SimpleUploadedFile('photo.png', content, 'image/png')
+    response = author_client.patch(f'/api/recipes/{recipe.pk}/', data,
+                                   format='multipart')
+    assert response.status_code == 200, response.data
+    old_name = recipe.image.name
+    recipe.refresh_from_db()
+    assert recipe.image.name != old_name
+    assert (media_root / recipe.image.name).read_bytes() == content
@@ -0,0 +1,13 @@
+import pytest
+from django.core.management import call_command
+from django.db import connection
+
+pytestmark = [
+    pytest.mark.django_db,
+    pytest.mark.skipif(connection.vendor != 'postgresql',
+                       reason='планы запросов проверяются на PostgreSQL'),
+]
+
+
+def test_hot_queries_use_indexes(user, recipes):
+    call_command('check_query_plans')
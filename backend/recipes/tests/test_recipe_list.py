@@ -0,0 +1,74 @@
+import pytest
+
+from recipes.models import Favorite, ShoppingCart, Tag
+from recipes.serializers import TagSerializer
+from recipes.snapshots import get_snapshot
+from users.models import Follow
+
+# COUNT для пагинации, рецепты с автором и флагами, теги, ингредиенты.
+LIST_QUERIES = 4
+# Рецепт с автором и флагами, теги, ингредиенты, Last-Modified.
+DETAIL_QUERIES = 4
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture(autouse=True)
+def user_relations(user, author, recipes):
+    Favorite.objects.create(user=user, favorite=recipes[0])
+    ShoppingCart.objects.create(user=user, recipe=recipes[1])
+    Follow.objects.create(user=user, following=author)
+    # Снимок тегов для фильтра загружается один раз на процесс.
+    get_snapshot(Tag, TagSerializer)
+
+
+@pytest.mark.parametrize('limit', (1, 100))
+def test_list_query_count_anonymous(anonymous_client,
+                                    django_assert_num_queries, limit):
+    with django_assert_num_queries(LIST_QUERIES):
+        response = anonymous_client.get(f'/api/recipes/?limit={limit}')
+    assert response.status_code == 200
+    recipe = response.data['results'][0]
+    assert not recipe['is_favorited']
+    assert not recipe['is_in_shopping_cart']
+    assert not recipe['author']['is_subscribed']
+
+
+@pytest.mark.parametrize('limit', (1, 100))
+def test_list_query_count_authenticated(user_client, recipes,
+                                        django_assert_num_queries, limit):
+    with django_assert_num_queries(LIST_QUERIES):
+        response = user_client.get(f'/api/recipes/?limit={limit}')
+    assert response.status_code == 200
+    assert len(response.data['results']) == min(limit, len(recipes))
+    results = {recipe['id']: recipe for recipe in response.data['results']}
+    if recipes[0].pk in results:
+        assert results[recipes[0].pk]['is_favorited']
+    assert all(recipe['author']['is_subscribed']
+               for recipe in results.values())
+
+
+@pytest.mark.parametrize('client_name', ('anonymous_client', 'user_client'))
+def test_detail_query_count(request, client_name, recipes,
+                            django_assert_num_queries):
+    client = request.getfixturevalue(client_name)
+    with django_assert_num_queries(DETAIL_QUERIES):
+        response = client.get(f'/api/recipes/{recipes[1].pk}/')
+    assert response.status_code == 200
+    assert response.data['is_in_shopping_cart'] == (
+        client_name == 'user_client')
+    assert len(response.data['ingredients']) == 3
+
+
+@pytest.mark.parametrize('param', ('is_favorited', 'is_in_shopping_cart'))
+def test_user_filters_anonymous(anonymous_client, param):
+    response = anonymous_client.get(f'/api/recipes/?{param}=1')
+    assert response.status_code == 200
+    assert response.data['count'] == 0
+
+
+@pytest.mark.parametrize('param', ('is_favorited', 'is_in_shopping_cart'))
+def test_user_filters_authenticated(user_client, param):
+    response = user_client.get(f'/api/recipes/?{param}=1')
+    assert response.status_code == 200
+    assert response.data['count'] == 1
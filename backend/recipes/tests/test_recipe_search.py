@@ -0,0 +1,74 @@
+import pytest
+
+from recipes.models import Favorite
+from recipes.search import RecipeTextIndex, get_recipe_text_index
+from .conftest import create_recipe
+
+pytestmark = pytest.mark.django_db
+
+URL = '/api/recipes/'
+
+
+@pytest.fixture
+def soups(author, user, tags, ingredients):
+    """Борщ в названии, борщ только в тексте и рецепт без борща."""
+    named = create_recipe(author, tags[:1], ingredients[:1], name='Борщ',
+                          text='Свёкла и капуста')
+    mentioned = create_recipe(user, tags[1:2], ingredients[:1], name='Щи',
+                              text='Почти как борщ, но без свёклы')
+    create_recipe(author, tags[:1], ingredients[:1], name='Окрошка',
+                  text='Квас и огурцы')
+    return named, mentioned
+
+
+def search_ids(client, query, **params):
+    response = client.get(URL, {'search': query, **params})
+    assert response.status_code == 200
+    return [recipe['id'] for recipe in response.json()['results']]
+
+
+def test_name_ranks_above_text(anonymous_client, soups):
+    named, mentioned = soups
+    # Щи опубликованы позже, но слово в названии весит больше.
+    assert search_ids(anonymous_client, 'борщ') == [named.pk, mentioned.pk]
+
+
+def test_all_words_must_match(anonymous_client, soups):
+    assert search_ids(anonymous_client, 'борщ капуста') == [soups[0].pk]
+    assert search_ids(anonymous_client, 'борщ квас') == []
+
+
+@pytest.mark.parametrize('param, expected', (
+    ('tags', [1]),
+    ('author', [0]),
+    ('is_favorited', [1]),
+))
+def test_search_with_filters(user_client, user, author, soups, param,
+                             expected):
+    Favorite.objects.create(user=user, favorite=soups[1])
+    value = {'tags': 'tag1', 'author': author.pk, 'is_favorited': 1}[param]
+    assert search_ids(user_client, 'борщ', **{param: value}) == [
+        soups[index].pk for index in expected]
+
+
+def test_yo_is_normalized():
+    index = RecipeTextIndex([(1, 'Ёжики', 'с рисом'),
+                             (2, 'Тефтели', 'ещё с рисом')])
+    assert index.search('ежики') == {1: 1.0}
+    assert index.search('ЕЩЕ') == {2: 0.4}
+
+
+def test_index_is_rebuilt_after_edit(user_client, user, tags, ingredients,
+                                     django_capture_on_commit_callbacks):
+    with django_capture_on_commit_callbacks(execute=True):
+        recipe = create_recipe(user, tags[:1], ingredients[:1], name='Борщ')
+    assert get_recipe_text_index().search('борщ') == {recipe.pk: 1.0}
+    with django_capture_on_commit_callbacks(execute=True):
+        response = user_client.patch(f'{URL}{recipe.pk}/', {
+            'name': 'Рассольник', 'text': 'Описание', 'cooking_time': 10,
+            'tags': [tags[0].pk],
+            'ingredients': [{'id': ingredients[0].pk, 'amount': 1}],
+        }, format='json')
+    assert response.status_code == 200, response.data
+    assert search_ids(user_client, 'борщ') == []
+    assert search_ids(user_client, 'рассольник') == [recipe.pk]
@@ -0,0 +1,99 @@
+from io import StringIO
+
+import pytest
+from django.core.management import call_command
+from rest_framework.test import APIClient
+
+from recipes.cache import get_versions
+from recipes.models import IngredientInRecipe, ShoppingCart, ShoppingListItem
+from recipes.shopping_list import compute_shopping_list_totals
+from .conftest import create_recipe
+
+# Список покупок читается одним запросом при любом размере корзины.
+DOWNLOAD_QUERIES = 1
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.mark.parametrize('cart_size', (1, 30))
+def test_download_query_count(user, user_client, author, tags, ingredients,
+                              django_assert_num_queries, cart_size):
+    for number in range(cart_size):
+        recipe = create_recipe(author, tags[:1], ingredients[:3], number)
+        ShoppingCart.objects.create(user=user, recipe=recipe)
+
+    with django_assert_num_queries(DOWNLOAD_QUERIES):
+        response = user_client.get('/api/recipes/download_shopping_cart/')
+        content = b''.join(response.streaming_content).decode()
+
+    assert response.status_code == 200
+    # В каждом рецепте i-й ингредиент взят в количестве i.
+    expected = sorted(
+        f'{ingredient.name} ({ingredient.measurement_unit}) — '
+        f'{amount * cart_size}'
+        for amount, ingredient in enumerate(ingredients[:3], start=1))
+    assert sorted(content.splitlines()[2:]) == expected
+
+
+def get_shopping_lists():
+    return {(item.user_id, item.ingredient_id): item.total_amount
+            for item in ShoppingListItem.objects.all()}
+
+
+@pytest.fixture
+def cart_recipes(user, author, tags, ingredients):
+    recipes = [create_recipe(author, tags[:1], ingredients[:3], number)
+               for number in range(2)]
+    for recipe in recipes:
+        ShoppingCart.objects.create(user=user, recipe=recipe)
+    return recipes
+
+
+def test_ingredient_rows_changed_directly(cart_recipes, ingredients):
+    row = IngredientInRecipe.objects.get(recipe=cart_recipes[0],
+                                         ingredient=ingredients[0])
+    row.amount = 10
+    row.save()
+    row = IngredientInRecipe.objects.get(recipe=cart_recipes[0],
+                                         ingredient=ingredients[1])
+    row.ingredient = ingredients[4]
+    row.save()
+    IngredientInRecipe.objects.create(recipe=cart_recipes[1],
+                                      ingredient=ingredients[5], amount=7)
+    IngredientInRecipe.objects.get(recipe=cart_recipes[1],
+                                   ingredient=ingredients[2]).delete()
+    assert get_shopping_lists() == compute_shopping_list_totals()
+
+
+def test_ingredient_deleted(cart_recipes, ingredients):
+    ingredients[0].delete()
+    assert get_shopping_lists() == compute_shopping_list_totals()
+
+
+def test_recipe_deleted(cart_recipes):
+    cart_recipes[0].delete()
+    assert get_shopping_lists() == compute_shopping_list_totals()
+
+
+def test_recipe_updated(cart_recipes, author, tags, ingredients):
+    client = APIClient()
+    client.force_authenticate(author)
+    response = client.patch(
+        f'/api/recipes/{cart_recipes[0].pk}/',
+        {'tags': [tags[0].pk], 'name': 'Рецепт', 'text': 'Описание',
+         'cooking_time': 10,
+         'ingredients': [{'id': ingredients[0].pk, 'amount': 4},
+                         {'id': ingredients[3].pk, 'amount': 2}]},
+        format='json')
+    assert response.status_code == 200, response.data
+    assert get_shopping_lists() == compute_shopping_list_totals()
+
+
+def test_check_fix_resets_cached_downloads(
+        user, cart_recipes, django_capture_on_commit_callbacks):
+    ShoppingListItem.objects.filter(user=user).update(total_amount=1000)
+    versions = get_versions((ShoppingCart,), scope=user.pk)
+    with django_capture_on_commit_callbacks(execute=True):
+        call_command('check_shopping_lists', '--fix', stdout=StringIO())
+    assert get_shopping_lists() == compute_shopping_list_totals()
+    assert get_versions((ShoppingCart,), scope=user.pk) != versions
@@ -0,0 +1,78 @@
+import pytest
+from django.core.cache import cache
+
+from recipes import similar
+from recipes.similar import (CHANGE_KEY, SimilarIndex, get_change_number,
+                             get_similar_index, record_similar_change)
+from .conftest import create_recipe
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.mark.parametrize('pk', ('abc', 10 ** 9))
+def test_unknown_recipe(anonymous_client, pk):
+    response = anonymous_client.get(f'/api/recipes/{pk}/similar/')
+    assert response.status_code == 404
+
+
+@pytest.fixture(autouse=True)
+def reset_index(monkeypatch, settings, tmp_path):
+    settings.SIMILAR_INDEX_PATH = str(tmp_path / 'similar_index.npz')
+    monkeypatch.setattr(similar, '_similar_index', None)
+
+
+def similar_ids(client, recipe):
+    response = client.get(f'/api/recipes/{recipe.pk}/similar/')
+    assert response.status_code == 200
+    return [item['id'] for item in response.json()]
+
+
+def test_changes_are_applied_in_place(
+        anonymous_client, author, tags, ingredients,
+        django_capture_on_commit_callbacks):
+    with django_capture_on_commit_callbacks(execute=True):
+        first = create_recipe(author, tags, ingredients[:3], 1)
+        record_similar_change(first.pk)
+    index = get_similar_index()
+    assert similar_ids(anonymous_client, first) == []
+
+    with django_capture_on_commit_callbacks(execute=True):
+        second = create_recipe(author, tags, ingredients[:3], 2)
+        record_similar_change(second.pk)
+    assert similar_ids(anonymous_client, first) == [second.pk]
+
+    with django_capture_on_commit_callbacks(execute=True):
+        # Изменение в обход сериализатора попадает в журнал по сигналу.
+        row = second.ingredientinrecipe_set.get(ingredient=ingredients[0])
+        row.ingredient = ingredients[5]
+        row.save()
+    assert similar_ids(anonymous_client, first) == [second.pk]
+    assert get_similar_index().search(first.pk, 1)[0][1] < 1
+
+    with django_capture_on_commit_callbacks(execute=True):
+        second.delete()
+    assert similar_ids(anonymous_client, first) == []
+    assert get_similar_index() is index
+
+
+def test_lost_journal_entry_rebuilds_index(
+        author, tags, ingredients, django_capture_on_commit_callbacks):
+    first = create_recipe(author, tags, ingredients[:3], 1)
+    index = get_similar_index()
+    with django_capture_on_commit_callbacks(execute=True):
+        second = create_recipe(author, tags, ingredients[:3], 2)
+        record_similar_change(second.pk)
+    cache.delete(CHANGE_KEY.format(get_change_number()))
+    rebuilt = get_similar_index()
+    assert rebuilt is not index
+    assert rebuilt.search(first.pk, 10) == [(second.pk, 1.0)]
+
+
+def test_saved_index_catches_up(author, tags, ingredients, settings,
+                                django_capture_on_commit_callbacks):
+    first = create_recipe(author, tags, ingredients[:3], 1)
+    SimilarIndex.build().save(settings.SIMILAR_INDEX_PATH)
+    with django_capture_on_commit_callbacks(execute=True):
+        second = create_recipe(author, tags, ingredients[:3], 2)
+        record_similar_change(second.pk)
+    assert get_similar_index().search(first.pk, 10) == [(second.pk, 1.0)]
@@ -3,7 +3,8 @@ from rest_framework.routers import DefaultRouter
 
 from .views import (TagViewSet, IngredientViewSet, RecipeViewSet,
                     FavoriteViewSet, ShoppingCartViewSet,
-                    DownloadShoppingCartView)
+                    DownloadShoppingCartView, BulkFavoriteView,
+                    BulkShoppingCartView)
 
 router = DefaultRouter()
 router.register('tags', TagViewSet)
@@ -14,6 +15,10 @@ urlpatterns = [
     path('recipes/download_shopping_cart/',
          DownloadShoppingCartView.as_view(),
          name='download_shopping_cart'),
+    path('recipes/favorite/bulk/', BulkFavoriteView.as_view(),
+         name='favorite_bulk'),
+    path('recipes/shopping_cart/bulk/', BulkShoppingCartView.as_view(),
+         name='shopping_cart_bulk'),
     path('', include(router.urls)),
     path('recipes/<int:recipe_id>/favorite/',
          FavoriteViewSet.as_view({'post': 'create',
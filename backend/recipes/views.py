@@ -1,20 +1,48 @@
-from collections import defaultdict
-
 from django_filters import rest_framework as filters
-from django.http import HttpResponse
-from django.shortcuts import get_object_or_404
+from django_filters.utils import translate_validation
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db.models import Q
+from django.http import HttpResponse, StreamingHttpResponse
+from django.utils.dateparse import parse_datetime
 from rest_framework import viewsets, status
-from rest_framework.pagination import PageNumberPagination
+from rest_framework.decorators import action
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.generics import get_object_or_404
+from rest_framework.pagination import (Cursor, CursorPagination,
+                                       PageNumberPagination)
+from rest_framework.parsers import JSONParser
+from rest_framework.permissions import (IsAuthenticated,
+                                        IsAuthenticatedOrReadOnly)
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
+from users.models import Follow
+from .cache import (CachedResponseMixin, ConditionalGetMixin,
+                    get_response_cache_key)
+from .facets import get_recipe_facets
 from .filters import RecipeFilter
-from .models import (ShoppingCart, Ingredient,
+from .models import (ShoppingCart, Ingredient, IngredientInRecipe,
                      Tag, Recipe, Favorite)
+from .parsers import MultiPartJSONParser
 from .permissions import PublicAccess
+from .relations import (create_relation, create_relations, delete_relation,
+                        delete_relations)
+from .renderers import PDFRenderer
+from .search import IngredientSearchMixin, get_cookable_index
 from .serializers import (RecipeSerializer, RecipeListSerializer,
                           TagSerializer, IngredientSerializer,
-                          FavoriteSerializer, ShoppingCartSerializer)
+                          FavoriteRecipeSerializer, BulkRecipeIdsSerializer,
+                          CookableQuerySerializer, CookableRecipeSerializer,
+                          SimilarQuerySerializer, SimilarRecipeSerializer)
+from .shopping_list import (get_shopping_list, get_shopping_list_pdf,
+                            render_text)
+from .similar import get_similar_index
+from .snapshots import SnapshotMixin
+
+User = get_user_model()
 
 
 class RecipeListPagination(PageNumberPagination):
@@ -23,100 +51,356 @@ class RecipeListPagination(PageNumberPagination):
     max_page_size = 100
 
 
-class RecipeViewSet(viewsets.ModelViewSet):
+class RecipeCursorPagination(CursorPagination):
+    """
+    Курсорная пагинация по ключу (pub_date, id), от новых рецептов к старым.
+    """
+    page_size = 10
+    page_size_query_param = 'limit'
+    max_page_size = 100
+    key_field = 'id'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.page_size = self.get_page_size(request)
+        self.base_url = request.build_absolute_uri()
+        self.cursor = self.decode_cursor(request)
+        self.reverse = self.cursor is not None and self.cursor.reverse
+        position = self.get_cursor_position()
+
+        key = self.key_field
+        if self.reverse:
+            queryset = queryset.order_by('pub_date', key)
+            if position is not None:
+                pub_date, pk = position
+                queryset = queryset.filter(
+                    Q(pub_date__gt=pub_date)
+                    | Q(pub_date=pub_date, **{f'{key}__gt': pk}))
+        else:
+            queryset = queryset.order_by('-pub_date', f'-{key}')
+            if position is not None:
+                pub_date, pk = position
+                queryset = queryset.filter(
+                    Q(pub_date__lt=pub_date)
+                    | Q(pub_date=pub_date, **{f'{key}__lt': pk}))
+
+        results = list(queryset[:self.page_size + 1])
+        has_more = len(results) > self.page_size
+        self.page = results[:self.page_size]
+        if self.reverse:
+            self.page.reverse()
+            self.has_next = position is not None
+            self.has_previous = has_more
+        else:
+            self.has_next = has_more
+            self.has_previous = position is not None
+        return self.page
+
+    def get_cursor_position(self):
+        if self.cursor is None or self.cursor.position is None:
+            return None
+        try:
+            pub_date, pk = self.cursor.position.split('|')
+            pub_date = parse_datetime(pub_date)
+            pk = int(pk)
+        except ValueError:
+            raise NotFound(self.invalid_cursor_message)
+        if pub_date is None:
+            raise NotFound(self.invalid_cursor_message)
+        return pub_date, pk
+
+    def _get_position_from_instance(self, instance, ordering=None):
+        return (f'{instance.pub_date.isoformat()}|'
+                f'{getattr(instance, self.key_field)}')
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        if self.page:
+            position = self._get_position_from_instance(self.page[-1])
+        else:
+            position = self.cursor.position
+        return self.encode_cursor(
+            Cursor(offset=0, reverse=False, position=position))
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if self.page:
+            position = self._get_position_from_instance(self.page[0])
+        else:
+            position = self.cursor.position
+        return self.encode_cursor(
+            Cursor(offset=0, reverse=True, position=position))
+
+
+class FeedCursorPagination(RecipeCursorPagination):
+    """Пагинация ленты по ключу (pub_date, recipe_id) записей FeedEntry."""
+    key_field = 'recipe_id'
+
+
+class RecipeViewSet(ConditionalGetMixin, CachedResponseMixin,
+                    viewsets.ModelViewSet):
+    cache_models = (Recipe, IngredientInRecipe, Tag, Ingredient, User)
+    cache_authenticated = False
+    user_cache_models = (Favorite, ShoppingCart, Follow)
+    object_cache_models = (Tag, Ingredient, User)
+    modified_field = 'updated_at'
     pagination_class = RecipeListPagination
+    parser_classes = (JSONParser, MultiPartJSONParser)
+    permission_classes = (IsAuthenticatedOrReadOnly,)
     queryset = Recipe.objects.all()
     filter_backends = (filters.DjangoFilterBackend,)
     filterset_class = RecipeFilter
 
+    @property
+    def paginator(self):
+        """
+        Курсорная пагинация включается параметром ?cursor=,
+        по умолчанию остаётся постраничная.
+        """
+        if not hasattr(self, '_paginator'):
+            cursor_param = RecipeCursorPagination.cursor_query_param
+            if cursor_param in self.request.query_params:
+                self._paginator = RecipeCursorPagination()
+            else:
+                self._paginator = self.pagination_class()
+        return self._paginator
+
+    def get_queryset(self):
+        if self.action in ('list', 'retrieve', 'feed', 'cookable',
+                           'similar'):
+            return Recipe.objects.with_user_data(self.request.user)
+        return super().get_queryset()
+
     def get_serializer_class(self):
-        if self.action in ('list', 'retrieve'):
+        if self.action == 'cookable':
+            return CookableRecipeSerializer
+        if self.action == 'similar':
+            return SimilarRecipeSerializer
+        if self.action in ('list', 'retrieve', 'feed'):
             return RecipeListSerializer
         return RecipeSerializer
 
     def perform_create(self, serializer):
         serializer.save(author=self.request.user)
 
+    @action(detail=False, permission_classes=(IsAuthenticated,))
+    def feed(self, request):
+        """
+        Новые рецепты авторов из подписок. Страница читается из
+        FeedEntry по индексу (user, pub_date, recipe), рецепты
+        подгружаются одним запросом по id.
+        """
+        paginator = FeedCursorPagination()
+        entries = paginator.paginate_queryset(
+            request.user.feed.all(), request, view=self)
+        recipes = self.get_queryset().in_bulk(
+            [entry.recipe_id for entry in entries])
+        serializer = self.get_serializer(
+            [recipes[entry.recipe_id] for entry in entries
+             if entry.recipe_id in recipes], many=True)
+        return paginator.get_paginated_response(serializer.data)
+
+    @action(detail=False)
+    def cookable(self, request):
+        """
+        Рецепты из имеющихся ингредиентов (?ingredients=1&ingredients=2)
+        по убыванию доли покрытых ингредиентов рецепта. Ранжирование
+        идёт по индексу в памяти, из базы читается только страница.
+        """
+        query = CookableQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        ranked = get_cookable_index().search(
+            query.validated_data['ingredients'])
+        paginator = self.pagination_class()
+        page = paginator.paginate_queryset(ranked, request, view=self)
+        recipes = self.get_queryset().in_bulk(
+            [recipe_id for recipe_id, _ in page])
+        results = []
+        for recipe_id, coverage in page:
+            if recipe_id in recipes:
+                recipes[recipe_id].coverage = coverage
+                results.append(recipes[recipe_id])
+        serializer = self.get_serializer(results, many=True)
+        return paginator.get_paginated_response(serializer.data)
 
-class TagViewSet(viewsets.ReadOnlyModelViewSet):
+    @action(detail=False)
+    def facets(self, request):
+        """
+        Число рецептов по тегам и времени приготовления при текущих
+        фильтрах RecipeFilter; счётчики тегов - без фильтра по тегам.
+        Ответ анонимам без фильтров кешируется до изменения рецептов
+        или тегов.
+        """
+        if request.user.is_authenticated or request.query_params:
+            return Response(self.get_facets())
+        key = get_response_cache_key(request, (Recipe, Tag))
+        data = cache.get(key)
+        if data is None:
+            data = self.get_facets()
+            cache.set(key, data, settings.RESPONSE_CACHE_TIMEOUT)
+        return Response(data)
+
+    def get_facets(self):
+        filterset = self.filterset_class(
+            self.request.query_params, queryset=self.get_queryset(),
+            request=self.request)
+        if not filterset.is_valid():
+            raise translate_validation(filterset.errors)
+        return get_recipe_facets(*filterset.get_facet_filters())
+
+    @action(detail=True)
+    def similar(self, request, pk=None):
+        """
+        Рецепты с похожим набором ингредиентов (?limit=, до 50)
+        по оценке сходства Жаккара из индекса MinHash.
+        """
+        query = SimilarQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        recipe = get_object_or_404(Recipe, pk=pk)
+        ranked = get_similar_index().search(recipe.pk,
+                                            query.validated_data['limit'])
+        recipes = self.get_queryset().in_bulk(
+            [recipe_id for recipe_id, _ in ranked])
+        results = []
+        for recipe_id, similarity in ranked:
+            if recipe_id in recipes:
+                recipes[recipe_id].similarity = similarity
+                results.append(recipes[recipe_id])
+        serializer = self.get_serializer(results, many=True)
+        return Response(serializer.data)
+
+
+class TagViewSet(ConditionalGetMixin, SnapshotMixin,
+                 viewsets.ReadOnlyModelViewSet):
+    cache_models = (Tag,)
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
     permission_classes = [PublicAccess]
 
 
-class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
+class IngredientViewSet(ConditionalGetMixin, IngredientSearchMixin,
+                        SnapshotMixin, viewsets.ReadOnlyModelViewSet):
+    cache_models = (Ingredient,)
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
     permission_classes = [PublicAccess]
 
 
-class FavoriteViewSet(viewsets.ModelViewSet):
+class RecipeRelationViewSet(viewsets.GenericViewSet):
+    """
+    Добавление рецепта в избранное или корзину и удаление из них:
+    по одному запросу к базе на изменение.
+    """
     lookup_url_kwarg = 'recipe_id'
-    queryset = Favorite.objects.all()
-    serializer_class = FavoriteSerializer
+    queryset = Recipe.objects.all()
+    serializer_class = FavoriteRecipeSerializer
+    model = None
+    relation_field = None
+    exists_message = None
+    missing_message = None
 
-    def perform_create(self, serializer):
-        recipe_id = self.kwargs.get(self.lookup_url_kwarg)
-        favorite = get_object_or_404(Recipe, id=int(recipe_id))
-        user = self.request.user
-        serializer.save(user=user, favorite=favorite)
+    def create(self, request, recipe_id):
+        if not create_relation(self.model, request.user,
+                               self.relation_field, recipe_id):
+            get_object_or_404(Recipe, id=recipe_id)
+            raise ValidationError(self.exists_message)
+        serializer = self.get_serializer(self.get_object())
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
 
     def destroy(self, request, recipe_id):
-        favorite = get_object_or_404(Recipe, id=int(recipe_id))
-        user = self.request.user
-        favor = get_object_or_404(Favorite, user=user, favorite=favorite)
-        favor.delete()
+        if not delete_relation(self.model, request.user,
+                               self.relation_field, recipe_id):
+            raise NotFound(self.missing_message)
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
-class ShoppingCartViewSet(viewsets.ModelViewSet):
-    lookup_url_kwarg = 'recipe_id'
-    queryset = ShoppingCart.objects.all()
-    serializer_class = ShoppingCartSerializer
+class FavoriteViewSet(RecipeRelationViewSet):
+    model = Favorite
+    relation_field = 'favorite'
+    exists_message = 'Рецепт уже в избранном'
+    missing_message = 'Рецепта нет в избранном'
 
-    def perform_create(self, serializer):
-        recipe_id = self.kwargs.get(self.lookup_url_kwarg)
-        recipe = get_object_or_404(Recipe, id=int(recipe_id))
-        user = self.request.user
-        serializer.save(user=user, recipe=recipe)
 
-    def destroy(self, request, recipe_id):
-        recipe = get_object_or_404(Recipe, id=int(recipe_id))
-        user = self.request.user
-        recipe_in_cart = get_object_or_404(ShoppingCart, user=user,
-                                           recipe=recipe)
-        recipe_in_cart.delete()
-        return Response(status=status.HTTP_204_NO_CONTENT)
+class ShoppingCartViewSet(RecipeRelationViewSet):
+    model = ShoppingCart
+    relation_field = 'recipe'
+    exists_message = 'Рецепт уже в корзине'
+    missing_message = 'Рецепта нет в корзине'
 
 
-class DownloadShoppingCartView(APIView):
-    def get(self, request):
-        user = self.request.user
-        recipes_in_shopping_cart = user.shopping_cart.all()
+class BulkRecipeRelationView(APIView):
+    """
+    Добавление и удаление списка рецептов с результатом по каждому id.
+    """
+    model = None
+    recipe_field = None
+
+    def get_recipe_ids(self, request):
+        serializer = BulkRecipeIdsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        return list(dict.fromkeys(serializer.validated_data['recipes']))
 
-        ingredients_summary = defaultdict(float)
+    def post(self, request):
+        recipe_ids = self.get_recipe_ids(request)
+        created = create_relations(self.model, request.user,
+                                   self.recipe_field, recipe_ids)
+        # Не добавленный рецепт либо уже связан, либо не существует.
+        skipped = [pk for pk in recipe_ids if pk not in created]
+        existing = set(Recipe.objects.filter(id__in=skipped)
+                       .values_list('id', flat=True)) if skipped else set()
+        results = [
+            {'id': recipe_id,
+             'status': ('created' if recipe_id in created
+                        else 'exists' if recipe_id in existing
+                        else 'not_found')}
+            for recipe_id in recipe_ids
+        ]
+        return Response({'results': results})
 
-        for cart_item in recipes_in_shopping_cart:
-            recipe = cart_item.recipe
-            ingredients_in_recipe = recipe.ingredientinrecipe_set.all()
+    def delete(self, request):
+        recipe_ids = self.get_recipe_ids(request)
+        deleted = delete_relations(self.model, request.user,
+                                   self.recipe_field, recipe_ids)
+        results = [
+            {'id': recipe_id,
+             'status': 'deleted' if recipe_id in deleted else 'not_found'}
+            for recipe_id in recipe_ids
+        ]
+        return Response({'results': results})
 
-            for ingredient_in_recipe in ingredients_in_recipe:
-                ingredient = ingredient_in_recipe.ingredient
-                amount = ingredient_in_recipe.amount
-                measurement_unit = ingredient.measurement_unit
 
-                ingredient_line = (f'{ingredient.name} ({amount} '
-                                   f'{measurement_unit})')
+class BulkFavoriteView(BulkRecipeRelationView):
+    model = Favorite
+    recipe_field = 'favorite'
 
-                ingredients_summary[ingredient_line] += float(amount)
 
-        content = 'Список покупок:\n\n'
+class BulkShoppingCartView(BulkRecipeRelationView):
+    model = ShoppingCart
+    recipe_field = 'recipe'
 
-        for ingredient_line, amount in ingredients_summary.items():
-            content += f'{ingredient_line} — {amount} г\n'
 
-        response = HttpResponse(content, content_type='text/plain')
+class DownloadShoppingCartView(APIView):
+    renderer_classes = (JSONRenderer, PDFRenderer)
+
+    def handle_exception(self, exc):
+        # Ошибки отдаются в JSON, даже если запрошен PDF.
+        self.request.accepted_renderer = JSONRenderer()
+        self.request.accepted_media_type = JSONRenderer.media_type
+        return super().handle_exception(exc)
+
+    def get(self, request):
+        if request.accepted_renderer.format == 'pdf':
+            response = HttpResponse(get_shopping_list_pdf(request.user),
+                                    content_type='application/pdf')
+            response['Content-Disposition'] = ('attachment; '
+                                               'filename="shopping_cart.pdf"')
+            return response
+
+        shopping_list = get_shopping_list(request.user)
+        response = StreamingHttpResponse(
+            render_text(shopping_list),
+            content_type='text/plain; charset=utf-8')
         response['Content-Disposition'] = ('attachment; '
                                            'filename="shopping_cart.txt"')
-
         return response
@@ -0,0 +1,37 @@
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, Min, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def remove_duplicates(apps, schema_editor):
+    Follow = apps.get_model('users', 'Follow')
+    CustomUser = apps.get_model('users', 'CustomUser')
+    duplicates = (Follow.objects.order_by().values('user', 'following')
+                  .annotate(min_id=Min('id'), count=Count('id'))
+                  .filter(count__gt=1))
+    for duplicate in duplicates:
+        Follow.objects.filter(
+            user=duplicate['user'], following=duplicate['following']
+        ).exclude(id=duplicate['min_id']).delete()
+
+    followers = (Follow.objects.filter(following=OuterRef('pk'))
+                 .order_by().values('following')
+                 .annotate(count=Count('pk')).values('count'))
+    CustomUser.objects.update(followers_count=Coalesce(
+        Subquery(followers, output_field=IntegerField()), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0002_engagement_counters'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicates, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='follow',
+            constraint=models.UniqueConstraint(
+                fields=('user', 'following'), name='unique_follow'),
+        ),
+    ]
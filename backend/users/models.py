@@ -2,7 +2,25 @@ from django.db import models
 from django.contrib.auth.models import AbstractUser
 
 
-class CustomUser(AbstractUser):
+class CounterFieldsMixin:
+    """
+    Не записывает поля-счётчики при полном сохранении объекта:
+    они меняются только F()-обновлениями, а значения в загруженном
+    объекте могли устареть.
+    """
+    counter_fields = ()
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key
+                and field.name not in self.counter_fields
+            ]
+        super().save(*args, **kwargs)
+
+
+class CustomUser(CounterFieldsMixin, AbstractUser):
     email = models.EmailField(unique=True, verbose_name='Почта')
     first_name = models.CharField(blank=False, max_length=150,
                                   verbose_name='Имя')
@@ -10,6 +28,11 @@ class CustomUser(AbstractUser):
                                  verbose_name='Фамилия')
     username = models.CharField(blank=False, max_length=150,
                                 verbose_name='Логин')
+    recipes_count = models.PositiveIntegerField(
+        default=0, editable=False, verbose_name='Рецептов')
+    followers_count = models.PositiveIntegerField(
+        default=0, editable=False, verbose_name='Подписчиков')
+    counter_fields = ('recipes_count', 'followers_count')
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ['username', 'first_name', 'last_name']
 
@@ -35,6 +58,14 @@ class Follow(models.Model):
 
     class Meta:
         ordering = ('user',)
+        constraints = (
+            models.UniqueConstraint(fields=('user', 'following'),
+                                    name='unique_follow'),
+        )
+        indexes = (
+            models.Index(fields=('following', 'user'),
+                         name='follow_following_user_idx'),
+        )
         verbose_name = 'Подписка'
         verbose_name_plural = 'Подписки'
 
@@ -1,12 +1,46 @@
+from django.db.models import (BooleanField, Prefetch, Value,
+                              prefetch_related_objects)
 from django.shortcuts import get_object_or_404
 from djoser.views import UserViewSet
 from rest_framework import generics, status, viewsets
+from rest_framework.exceptions import NotFound, ValidationError
 from rest_framework.pagination import PageNumberPagination
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 
 from .models import Follow, CustomUser
-from .serializers import FollowListSerializer, FollowSerializer
+from .serializers import FollowListSerializer
+from recipes.models import Recipe
+from recipes.relations import create_relation, delete_relation
+
+DEFAULT_RECIPES_LIMIT = 10
+
+
+def get_recipes_limit(request):
+    """Разбирает параметр recipes_limit один раз на запрос."""
+    recipes_limit = request.query_params.get('recipes_limit')
+    if recipes_limit is None:
+        return DEFAULT_RECIPES_LIMIT
+    try:
+        recipes_limit = int(recipes_limit)
+    except ValueError:
+        recipes_limit = -1
+    if recipes_limit < 0:
+        raise ValidationError(
+            {'recipes_limit': 'Ожидается неотрицательное целое число'})
+    return recipes_limit
+
+
+def prefetch_preview_recipes(authors, recipes_limit):
+    """
+    Подгружает авторам превью рецептов в preview_recipes одним запросом.
+    """
+    prefetch_related_objects(authors, Prefetch(
+        'recipes',
+        queryset=Recipe.objects.filter(author__in=authors)
+        .limit_per_author(recipes_limit),
+        to_attr='preview_recipes',
+    ))
 
 
 class FollowListPagination(PageNumberPagination):
@@ -14,13 +48,6 @@ class FollowListPagination(PageNumberPagination):
     page_size_query_param = 'limit'
     max_page_size = 100
 
-    def get_paginated_response(self, data):
-        recipes_limit = self.request.query_params.get('recipes_limit', None)
-        if recipes_limit is not None:
-            recipes_limit = int(recipes_limit)
-
-        return super().get_paginated_response(data)
-
 
 class CustomPagination(PageNumberPagination):
     page_size = 10
@@ -39,29 +66,39 @@ class FollowListViewSet(generics.ListAPIView):
     pagination_class = FollowListPagination
 
     def get_queryset(self):
-        user = self.request.user
-        follows = user.follow.all()
-        return [follow.following for follow in follows]
+        return CustomUser.objects.filter(
+            following__user=self.request.user
+        ).annotate(
+            is_subscribed=Value(True, output_field=BooleanField())
+        ).order_by('following__id')
 
-    def perform_create(self, serializer):
-        user = self.request.user
-        serializer.save(user=user)
+    def list(self, request):
+        recipes_limit = get_recipes_limit(request)
+        page = self.paginate_queryset(self.get_queryset())
+        prefetch_preview_recipes(page, recipes_limit)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
 
 
-class FollowViewSet(viewsets.ModelViewSet):
+class FollowViewSet(viewsets.GenericViewSet):
     lookup_url_kwarg = 'user_id'
-    queryset = Follow.objects.all()
-    serializer_class = FollowSerializer
+    queryset = CustomUser.objects.all()
+    serializer_class = FollowListSerializer
 
-    def perform_create(self, serializer):
-        user_id = self.kwargs.get(self.lookup_url_kwarg)
-        following = get_object_or_404(CustomUser, id=int(user_id))
-        user = self.request.user
-        serializer.save(user=user, following=following)
+    def create(self, request, user_id):
+        if user_id == request.user.pk:
+            raise ValidationError('Нельзя подписаться на самого себя')
+        recipes_limit = get_recipes_limit(request)
+        if not create_relation(Follow, request.user, 'following', user_id):
+            get_object_or_404(CustomUser, id=user_id)
+            raise ValidationError('Вы уже подписаны на данного автора')
+        author = self.get_object()
+        author.is_subscribed = True
+        prefetch_preview_recipes([author], recipes_limit)
+        serializer = self.get_serializer(author)
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
 
     def destroy(self, request, user_id):
-        following = get_object_or_404(CustomUser, id=int(user_id))
-        user = self.request.user
-        follow = get_object_or_404(Follow, user=user, following=following)
-        follow.delete()
+        if not delete_relation(Follow, request.user, 'following', user_id):
+            raise NotFound('Вы не подписаны на данного автора')
         return Response(status=status.HTTP_204_NO_CONTENT)